@@ -0,0 +1,45 @@
+"""create table: idempotency_key
+
+Revision ID: 3fa07d95c61e
+Revises: 8e41b7c2a9d0
+Create Date: 2026-10-17 11:58:23.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3fa07d95c61e'
+down_revision: Union[str, None] = '8e41b7c2a9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('idempotency_key',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('endpoint', sa.String(length=255), nullable=False),
+    sa.Column('request_hash', sa.String(length=64), nullable=False),
+    sa.Column('status_code', sa.Integer(), nullable=True),
+    sa.Column('response', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('expires_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'endpoint', 'key', name='idempotency_key_user_id_endpoint_key_key')
+    )
+    op.create_index(op.f('ix_idempotency_key_id'), 'idempotency_key', ['id'], unique=False)
+    op.create_index(op.f('ix_idempotency_key_expires_at'), 'idempotency_key', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_idempotency_key_expires_at'), table_name='idempotency_key')
+    op.drop_index(op.f('ix_idempotency_key_id'), table_name='idempotency_key')
+    op.drop_table('idempotency_key')
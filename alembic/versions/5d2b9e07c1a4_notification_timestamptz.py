@@ -0,0 +1,46 @@
+"""notification: timestamp to timestamptz, keyset indexes
+
+Revision ID: 5d2b9e07c1a4
+Revises: a6c2e81f4b37
+Create Date: 2026-10-17 17:02:13.540918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2b9e07c1a4'
+down_revision: Union[str, None] = 'a6c2e81f4b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Stored values are naive isoformat strings written in Tashkent time.
+    op.alter_column('notification', 'timestamp',
+                    existing_type=sa.String(),
+                    type_=sa.TIMESTAMP(timezone=True),
+                    postgresql_using="(\"timestamp\"::timestamp AT TIME ZONE 'Asia/Tashkent')",
+                    existing_nullable=True)
+    op.execute('UPDATE notification SET "timestamp" = COALESCE(last_seen, now()) WHERE "timestamp" IS NULL')
+    op.alter_column('notification', 'timestamp', server_default=sa.text('now()'), nullable=False)
+    op.create_index('ix_notification_type_timestamp_id', 'notification',
+                    ['type', sa.text('"timestamp" DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_notification_timestamp_id', 'notification',
+                    [sa.text('"timestamp" DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notification_timestamp_id', table_name='notification')
+    op.drop_index('ix_notification_type_timestamp_id', table_name='notification')
+    op.alter_column('notification', 'timestamp', server_default=None, nullable=True)
+    op.alter_column('notification', 'timestamp',
+                    existing_type=sa.TIMESTAMP(timezone=True),
+                    type_=sa.String(),
+                    postgresql_using="to_char(\"timestamp\" AT TIME ZONE 'Asia/Tashkent', 'YYYY-MM-DD\"T\"HH24:MI:SS.US')",
+                    existing_nullable=True)
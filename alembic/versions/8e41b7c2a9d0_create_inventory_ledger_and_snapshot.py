@@ -0,0 +1,63 @@
+"""create tables: inventory_ledger, inventory_snapshot
+
+Revision ID: 8e41b7c2a9d0
+Revises: dc73fec347a1
+Create Date: 2026-10-17 10:41:07.215904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41b7c2a9d0'
+down_revision: Union[str, None] = 'dc73fec347a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('inventory_ledger',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ingredient_id', sa.Integer(), nullable=False),
+    sa.Column('delta', sa.Float(), nullable=False),
+    sa.Column('source', sa.Enum('OPENING', 'DELIVERY', 'SERVING', 'CORRECTION', name='ledgersource'), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['ingredient_id'], ['ingredient.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_inventory_ledger_id'), 'inventory_ledger', ['id'], unique=False)
+    op.create_index('ix_inventory_ledger_ingredient_id_created_at', 'inventory_ledger',
+                    ['ingredient_id', 'created_at'], unique=False)
+    op.create_table('inventory_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ingredient_id', sa.Integer(), nullable=False),
+    sa.Column('weight', sa.Float(), nullable=False),
+    sa.Column('taken_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['ingredient_id'], ['ingredient.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_inventory_snapshot_id'), 'inventory_snapshot', ['id'], unique=False)
+    op.create_index('ix_inventory_snapshot_ingredient_id_taken_at', 'inventory_snapshot',
+                    ['ingredient_id', 'taken_at'], unique=False)
+
+    # Open the ledger with the current stock so it sums up to ingredient.weight from here on.
+    op.execute("""
+        INSERT INTO inventory_ledger (ingredient_id, delta, source, created_at)
+        SELECT id, weight, 'OPENING', now() FROM ingredient
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inventory_snapshot_ingredient_id_taken_at', table_name='inventory_snapshot')
+    op.drop_index(op.f('ix_inventory_snapshot_id'), table_name='inventory_snapshot')
+    op.drop_table('inventory_snapshot')
+    op.drop_index('ix_inventory_ledger_ingredient_id_created_at', table_name='inventory_ledger')
+    op.drop_index(op.f('ix_inventory_ledger_id'), table_name='inventory_ledger')
+    op.drop_table('inventory_ledger')
+    op.execute('DROP TYPE ledgersource')
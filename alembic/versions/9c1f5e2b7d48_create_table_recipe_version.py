@@ -0,0 +1,32 @@
+"""create table: recipe_version
+
+Revision ID: 9c1f5e2b7d48
+Revises: e4a70c3b9d16
+Create Date: 2026-10-17 21:02:36.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1f5e2b7d48'
+down_revision: Union[str, None] = 'e4a70c3b9d16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('recipe_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('recipe_version')
@@ -0,0 +1,30 @@
+"""notification: occurrence_count, last_seen
+
+Revision ID: a6c2e81f4b37
+Revises: 3fa07d95c61e
+Create Date: 2026-10-17 15:26:51.084379
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c2e81f4b37'
+down_revision: Union[str, None] = '3fa07d95c61e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notification', sa.Column('occurrence_count', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('notification', sa.Column('last_seen', sa.TIMESTAMP(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('notification', 'last_seen')
+    op.drop_column('notification', 'occurrence_count')
@@ -0,0 +1,34 @@
+"""create table: notification_read_cursor
+
+Revision ID: b83f1d6a2e95
+Revises: 5d2b9e07c1a4
+Create Date: 2026-10-17 18:11:47.206135
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83f1d6a2e95'
+down_revision: Union[str, None] = '5d2b9e07c1a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('notification_read_cursor',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('last_read_id', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('notification_read_cursor')
@@ -0,0 +1,32 @@
+"""portion_estimation: unique meal_id, meal_ingredient: ingredient_id index
+
+Revision ID: dc73fec347a1
+Revises: d36b33379dc8
+Create Date: 2026-10-17 09:12:40.518337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dc73fec347a1'
+down_revision: Union[str, None] = 'd36b33379dc8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # portion_estimation is derived data; it is rebuilt by the next full estimate.
+    op.execute('DELETE FROM portion_estimation')
+    op.create_unique_constraint('portion_estimation_meal_id_key', 'portion_estimation', ['meal_id'])
+    op.create_index(op.f('ix_meal_ingredient_ingredient_id'), 'meal_ingredient', ['ingredient_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_meal_ingredient_ingredient_id'), table_name='meal_ingredient')
+    op.drop_constraint('portion_estimation_meal_id_key', 'portion_estimation', type_='unique')
@@ -0,0 +1,64 @@
+"""token_blacklist: store token hash and expiry instead of the token
+
+Revision ID: e4a70c3b9d16
+Revises: b83f1d6a2e95
+Create Date: 2026-10-17 19:24:05.913270
+
+"""
+import base64
+import datetime
+import hashlib
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a70c3b9d16'
+down_revision: Union[str, None] = 'b83f1d6a2e95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def token_exp(token: str):
+    """``exp`` claim of a stored JWT, read without verifying it; None when it cannot be read"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return datetime.datetime.fromtimestamp(claims["exp"], datetime.timezone.utc)
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('token_blacklist', sa.Column('token_hash', sa.String(length=64), nullable=True))
+    op.add_column('token_blacklist', sa.Column('expires_at', sa.TIMESTAMP(timezone=True), nullable=True))
+
+    connection = op.get_bind()
+    rows = connection.execute(sa.text("SELECT id, jti FROM token_blacklist")).all()
+    for row_id, jti in rows:
+        connection.execute(
+            sa.text("UPDATE token_blacklist SET token_hash = :token_hash, expires_at = :expires_at WHERE id = :id"),
+            {"id": row_id, "token_hash": hashlib.sha256(jti.encode()).hexdigest(), "expires_at": token_exp(jti)},
+        )
+
+    op.alter_column('token_blacklist', 'token_hash', nullable=False)
+    op.create_unique_constraint('token_blacklist_token_hash_key', 'token_blacklist', ['token_hash'])
+    op.create_index(op.f('ix_token_blacklist_expires_at'), 'token_blacklist', ['expires_at'], unique=False)
+    op.drop_column('token_blacklist', 'jti')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The tokens themselves are gone; the hashes stand in for them so the old column stays non-null and unique.
+    op.add_column('token_blacklist', sa.Column('jti', sa.String(length=255), nullable=True))
+    op.execute("UPDATE token_blacklist SET jti = token_hash")
+    op.alter_column('token_blacklist', 'jti', nullable=False)
+    op.create_unique_constraint('token_blacklist_jti_key', 'token_blacklist', ['jti'])
+    op.drop_index(op.f('ix_token_blacklist_expires_at'), table_name='token_blacklist')
+    op.drop_constraint('token_blacklist_token_hash_key', 'token_blacklist', type_='unique')
+    op.drop_column('token_blacklist', 'expires_at')
+    op.drop_column('token_blacklist', 'token_hash')
@@ -8,6 +8,7 @@ from app.endpoints.serve_meal import router as serve_meal_router
 from app.endpoints.delivery import router as delivery_router
 from app.endpoints.portion_estimation import router as portion_estimation_router
 from app.endpoints.notification import router as notification_router
+from app.endpoints.ws_stats import router as ws_stats_router
 from app.reports import router as report_router
 
 router = APIRouter()
@@ -21,6 +22,7 @@ router.include_router(meal_ingredient_router, prefix="/meal-ingredient", tags=["
 router.include_router(serve_meal_router, prefix="/serve-meal", tags=["Serve Meal"])
 router.include_router(portion_estimation_router, prefix="/ws/portion", tags=["Portion Estimation"])
 router.include_router(notification_router, prefix="/ws/notification", tags=["Notification"])
+router.include_router(ws_stats_router, prefix="/ws", tags=["Websocket"])
 router.include_router(report_router, prefix="/report", tags=["Report"])
 
 
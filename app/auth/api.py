@@ -11,6 +11,7 @@ from app.auth.util import (authenticate_user, create_access_token, oauth2_scheme
                            get_login_info, read_me, UserDep, AdminDep, get_logging)
 from app.config import ACCESS_TOKEN_EXPIRE_MINUTES
 from app.db.get_db import SessionDep
+from app.functions.log_sink import action_log_sink, login_info_sink
 
 router = APIRouter()
 
@@ -28,7 +29,7 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     login_info = LoginInfoSchema(user_id=user.id, email=user.email, phone=user.phone, username=user.username)
-    await log_login_info(db, login_info)
+    await log_login_info(login_info)
     access_token_expires = timedelta(minutes=int(ACCESS_TOKEN_EXPIRE_MINUTES))
     access_token = create_access_token(
         data={
@@ -68,3 +69,9 @@ async def logging_endpoint(current_user: AdminDep, db: SessionDep, limit: int =
     items = [ActionLogRead.model_validate(log) for log in db_logging]
     return ActionLogListResponse(items=items, total_count=total_count)
 
+
+@router.get('/logging/stats')
+async def logging_stats_endpoint(current_user: AdminDep):
+    """Rows waiting in, written by and dropped from the write-behind log buffers"""
+    return {"action_log": action_log_sink.stats(), "login_info": login_info_sink.stats()}
+
@@ -0,0 +1,142 @@
+import asyncio
+import datetime
+import math
+from typing import Optional
+
+from sqlalchemy import delete, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.auth.model import TokenBlacklist
+from app.config import now_tashkent, TOKEN_BLACKLIST_CAPACITY, TOKEN_BLACKLIST_ERROR_RATE, \
+    TOKEN_BLACKLIST_RELOAD_INTERVAL_S
+from app.db.db import async_session_maker
+from app.functions.broadcast_bus import broadcast_bus, invalidations_reach_all_workers
+
+
+class BloomFilter:
+    """Bit array Bloom filter over sha256 hex keys; bit positions come from the key itself (double hashing)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, key: str):
+        h1, h2 = int(key[:16], 16), int(key[16:32], 16) | 1
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.size
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        h1, h2 = int(key[:16], 16), int(key[16:32], 16) | 1
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.size
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False  # Almost every valid token stops at the first probe or two
+        return True
+
+
+class TokenRevocations:
+    """
+    In-memory view of ``token_blacklist``, keyed by the sha256 of the token.
+
+    Every unexpired revoked token is in a Bloom filter, so a token that was never revoked is cleared
+    without touching the database. Tokens revoked since the last load (here or, via the broadcast
+    bus, on another worker) are also kept exactly; only a filter hit on an older token, or a false
+    positive, costs a lookup. The filter is rebuilt from the table every ``reload_interval`` seconds,
+    which also drops expired entries, and whenever the bus reconnects, since revocations published
+    meanwhile are lost. A filter miss is trusted when revocations reach every worker (a shared bus,
+    or ``API_SINGLE_PROCESS``); otherwise a miss still asks the database.
+    """
+
+    CHANNEL = "token_revoked"
+
+    def __init__(self, capacity: int, error_rate: float, reload_interval: float):
+        self.error_rate = error_rate
+        self.reload_interval = reload_interval
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.recent: dict[str, Optional[float]] = {}  # Hash -> token exp
+        self.db_lookups = 0
+        self.false_positives = 0
+        broadcast_bus.subscribe(self.CHANNEL, self._on_revoked)
+        broadcast_bus.on_reconnect(self.reload)
+
+    async def load(self, db: AsyncSession) -> int:
+        res = await db.execute(select(TokenBlacklist.token_hash)
+                               .where(or_(TokenBlacklist.expires_at.is_(None),
+                                          TokenBlacklist.expires_at > now_tashkent())))
+        hashes = res.scalars().all()
+        bloom = BloomFilter(max(self.bloom.capacity, 2 * len(hashes)), self.error_rate)
+        for key in hashes:
+            bloom.add(key)
+        # Revocations that arrived while the query ran are not in ``hashes`` yet
+        now = now_tashkent().timestamp()
+        self.recent = {k: e for k, e in self.recent.items() if e is None or e > now}
+        for key in self.recent:
+            bloom.add(key)
+        self.bloom = bloom
+        return len(hashes)
+
+    async def reload(self):
+        try:
+            async with async_session_maker() as session:
+                await self.load(session)
+        except Exception as e:
+            print(f"❌ Token blacklist reload failed: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    def _add(self, key: str, exp: Optional[float]):
+        if key in self.recent:
+            return
+        self.bloom.add(key)
+        self.recent[key] = exp
+        if self.bloom.count == self.bloom.capacity:
+            print(f"❌ Token blacklist filter is over capacity ({self.bloom.capacity}), "
+                  f"raise TOKEN_BLACKLIST_CAPACITY; lookups will hit the database more often")
+        if len(self.recent) > self.bloom.capacity:
+            now = now_tashkent().timestamp()
+            self.recent = {k: e for k, e in self.recent.items() if e is None or e > now}
+
+    def revoke(self, key: str, exp: Optional[float]):
+        self._add(key, exp)
+        broadcast_bus.publish(self.CHANNEL, {"key": key, "exp": exp})
+
+    def _on_revoked(self, message: dict):
+        self._add(message["key"], message["exp"])
+
+    async def contains(self, db: AsyncSession, key: str) -> bool:
+        in_filter = key in self.bloom
+        if not in_filter and invalidations_reach_all_workers():
+            return False
+        if key in self.recent:
+            return True
+        self.db_lookups += 1
+        revoked = await db.scalar(select(TokenBlacklist.id).filter_by(token_hash=key))
+        if revoked is None:
+            if in_filter:
+                self.false_positives += 1
+            return False
+        self.recent[key] = None
+        return True
+
+
+token_revocations = TokenRevocations(TOKEN_BLACKLIST_CAPACITY, TOKEN_BLACKLIST_ERROR_RATE,
+                                     TOKEN_BLACKLIST_RELOAD_INTERVAL_S)
+
+
+def token_expires_at(exp: Optional[float]) -> Optional[datetime.datetime]:
+    return datetime.datetime.fromtimestamp(exp, datetime.timezone.utc) if exp is not None else None
+
+
+async def purge_expired_tokens(db: AsyncSession) -> int:
+    res = await db.execute(delete(TokenBlacklist).where(TokenBlacklist.expires_at <= now_tashkent()))
+    await db.commit()
+    return res.rowcount
@@ -55,5 +55,6 @@ class TokenBlacklist(Base):
     __tablename__ = 'token_blacklist'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    jti: Mapped[str] = mapped_column(String(length=255), unique=True)
+    token_hash: Mapped[str] = mapped_column(String(length=64), unique=True)  # sha256 of the revoked token
+    expires_at: Mapped[datetime.datetime | None] = mapped_column(TIMESTAMP(timezone=True), nullable=True, index=True)
     created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True),default=now_tashkent)
\ No newline at end of file
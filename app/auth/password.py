@@ -0,0 +1,56 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+T = TypeVar("T")
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool instead of the event loop (bcrypt releases the GIL).
+
+    At most ``queue_limit`` calls may be running or waiting at once; beyond that the call is refused
+    with a 429 straight away, so a login storm queues a bounded amount of work and the rest of the
+    app keeps its latency.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail="Too many password checks in progress, try again shortly",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "queue_limit": self.queue_limit, "pending": self.pending,
+                "rejected": self.rejected}
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.run(pwd_context.hash, password)
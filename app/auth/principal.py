@@ -0,0 +1,103 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import jwt
+
+from app.config import SECRET, ALGORITHM, PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_S
+from app.functions.broadcast_bus import broadcast_bus, invalidations_reach_all_workers
+
+
+def decode_token(token: str) -> dict:
+    """Verified JWT claims; raises ``jwt.PyJWTError`` when the token is invalid or expired"""
+    return jwt.decode(token, SECRET, algorithms=[ALGORITHM])
+
+
+def token_key(token: str) -> str:
+    """Cache key for a token, so raw bearer tokens are neither kept around nor sent over the bus"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class PrincipalCache:
+    """
+    LRU of tokens that already passed the blacklist and user checks, with the principal they resolve to.
+
+    An entry lives ``ttl`` seconds at most and never past the token's own ``exp``. Logout drops the
+    token and a user update or delete drops every token of that user; invalidations also go over the
+    broadcast bus so other workers drop their copies. The cache is therefore only on when those
+    messages reach every worker (a shared bus, or ``API_SINGLE_PROCESS``); when the bus reconnects
+    (messages may have been lost) the whole cache is dropped.
+    """
+
+    CHANNEL = "principal_invalidate"
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.enabled = ttl > 0 and invalidations_reach_all_workers()
+        self.entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self.by_user: dict[int, set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        broadcast_bus.subscribe(self.CHANNEL, self._on_invalidate)
+        broadcast_bus.on_reconnect(self.clear)
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, principal: dict, token_exp: Optional[float]):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        self.entries[key] = (principal, expires_at)
+        self.entries.move_to_end(key)
+        self.by_user.setdefault(principal["id"], set()).add(key)
+        while len(self.entries) > self.size:
+            self._drop(next(iter(self.entries)))
+
+    def _drop(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self.by_user.get(entry[0]["id"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_user[entry[0]["id"]]
+
+    async def clear(self):
+        self.entries.clear()
+        self.by_user.clear()
+
+    def invalidate_token(self, token: str):
+        key = token_key(token)
+        self._drop(key)
+        broadcast_bus.publish(self.CHANNEL, {"key": key})
+
+    def invalidate_user(self, user_id: int):
+        for key in list(self.by_user.get(user_id, ())):
+            self._drop(key)
+        broadcast_bus.publish(self.CHANNEL, {"user_id": user_id})
+
+    def _on_invalidate(self, message: dict):
+        if "key" in message:
+            self._drop(message["key"])
+        else:
+            for key in list(self.by_user.get(message["user_id"], ())):
+                self._drop(key)
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_S)
@@ -1,5 +1,5 @@
 from app.auth.model import User, UserRole
-from app.auth.util import get_password_hash
+from app.auth.password import get_password_hash
 from app.db.get_db import async_session_maker
 from sqlalchemy.future import select
 
@@ -18,7 +18,7 @@ async def create_superuser():
                     username='admin',
                     first_name="Super",
                     last_name="User",
-                    hashed_password=get_password_hash("admin"),
+                    hashed_password=await get_password_hash("admin"),
                     role=UserRole.ADMIN,
                 )
                 session.add(superuser)
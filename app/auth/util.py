@@ -5,32 +5,38 @@ from sqlalchemy import func
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 from jwt import InvalidTokenError
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.model import User, LoginInfo, TokenBlacklist
+from app.auth.blacklist import token_revocations, token_expires_at
+from app.auth.password import verify_password, get_password_hash
+from app.auth.principal import decode_token, token_key, principal_cache
 from app.auth.schema import TokenData, UserRead, UserCreate, UserUpdateUnique, UserUpdatePassword, UserUpdateName, \
     LoginInfoSchema
 from app.config import SECRET, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.db.get_db import SessionDep
 from app.config import now_tashkent
 from app.models.action_log import ActionLog
+from app.functions.log_sink import login_info_sink
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
 
 async def blacklist_token(token: str, db: AsyncSession):
+    key = token_key(token)
+    exp = decode_token(token).get("exp")
     try:
-        token_blacklist = TokenBlacklist(jti=token)
+        token_blacklist = TokenBlacklist(token_hash=key, expires_at=token_expires_at(exp))
         db.add(token_blacklist)
         await db.commit()
         await db.refresh(token_blacklist)
+        token_revocations.revoke(key, exp)
+        principal_cache.invalidate_token(token)
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -38,24 +44,12 @@ async def blacklist_token(token: str, db: AsyncSession):
 
 async def is_token_blacklisted(token: str, db: AsyncSession) -> bool:
     try:
-        res = await db.execute(select(TokenBlacklist).filter_by(jti=token))
-        token_blacklist = res.scalars().first()
-        if token_blacklist:
-            return True
-        return False
+        return await token_revocations.contains(db, token_key(token))
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
-
-
 async def get_user_by_phone(db: AsyncSession, phone: str) -> UserRead:
     res = await db.execute(select(User).filter_by(phone=phone))
     user = res.scalars().first()
@@ -108,7 +102,7 @@ async def authenticate_user(db: AsyncSession, username: str, password: str):
     user = await get_user_by_username_with_pass(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
@@ -125,6 +119,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 
 
 async def get_current_user(
+        request: Request,
         token: Annotated[str, Depends(oauth2_scheme)],
         db: SessionDep,
 ) -> dict:
@@ -133,35 +128,42 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    is_t_black = await is_token_blacklisted(token, db)
-    if is_t_black:
-        raise credentials_exception
-    try:
-        payload = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        user_id: int = payload.get("user_id")
-        role: str = payload.get("role")
-        phone: str = payload.get("phone")
-        email: str = payload.get("email")
-        if username is None:
+    key = token_key(token)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+
+    # LoggingMiddleware already verified this token for the request
+    payload = getattr(request.state, "token_payload", None)
+    if payload is None or getattr(request.state, "token", None) != token:
+        try:
+            payload = decode_token(token)
+        except InvalidTokenError:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except InvalidTokenError:
+    username: str = payload.get("sub")
+    if username is None:
+        raise credentials_exception
+    token_data = TokenData(username=username)
+
+    if await is_token_blacklisted(token, db):
         raise credentials_exception
-    user = await get_user_by_username_with_pass(db, username=token_data.username)
-    if user is None:
+    user_exists = await db.scalar(select(User.id).filter_by(username=token_data.username))
+    if user_exists is None:
         raise credentials_exception
-    return {"id": user_id, "username": username, "role": role, "phone": phone, "email": email}
+
+    principal = {"id": payload.get("user_id"), "username": username, "role": payload.get("role"),
+                 "phone": payload.get("phone"), "email": payload.get("email")}
+    principal_cache.put(key, principal, payload.get("exp"))
+    return principal
 
 
 UserDep = Annotated[dict, Depends(get_current_user)]
 
 
 async def create_user(db: AsyncSession, user: UserCreate) -> UserRead:
+    hashed_password = await get_password_hash(user.password)
 
     try:
-        hashed_password = get_password_hash(user.password)
-
         user = User(
             hashed_password=hashed_password,
             phone=user.phone,
@@ -197,14 +199,15 @@ async def get_users(db: AsyncSession, limit: int = 10, page: int = 1, role: str
 
 async def update_user_password(db: AsyncSession, user_id: int, user: UserUpdatePassword):
     user_db = await get_user_by_id_with_pass(db, user_id)
-    if verify_password(user.password, user_db.hashed_password):
+    if await verify_password(user.password, user_db.hashed_password):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='New password cannot be the same as the old password')
 
+    hashed_pass = await get_password_hash(user.password)
     try:
-        hashed_pass = get_password_hash(user.password)
         user_db.hashed_password = hashed_pass
         db.add(user_db)
         await db.commit()
+        principal_cache.invalidate_user(user_id)
         return {"detail": "Password updated successfully"}
     except Exception as e:
         await db.rollback()
@@ -219,6 +222,7 @@ async def update_user_name(db: AsyncSession, user_id: int, user: UserUpdateName)
 
         db.add(user_db)
         await db.commit()
+        principal_cache.invalidate_user(user_id)
         return {"detail": "User name updated successfully"}
     except Exception as e:
         await db.rollback()
@@ -238,6 +242,7 @@ async def update_user_unique(db: AsyncSession, user_id: int, user: UserUpdateUni
 
         db.add(user_db)
         await db.commit()
+        principal_cache.invalidate_user(user_id)
         return UserRead.model_validate(user_db)
     except Exception as e:
         await db.rollback()
@@ -249,6 +254,7 @@ async def delete_user(db: AsyncSession, user_id: int):
     try:
         await db.delete(user)
         await db.commit()
+        principal_cache.invalidate_user(user_id)
         return {"detail": "User deleted successfully"}
     except Exception as e:
         await db.rollback()
@@ -260,15 +266,9 @@ async def read_me(db: AsyncSession, current_user) -> User:
     return user
 
 
-async def log_login_info(db: AsyncSession, login: LoginInfoSchema):
-    try:
-        login_info = LoginInfo(**login.model_dump())
-        db.add(login_info)
-        await db.commit()
-        await db.refresh(login_info)
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+async def log_login_info(login: LoginInfoSchema):
+    if not await login_info_sink.put({**login.model_dump(), "login_at": now_tashkent()}):
+        print(f"❌ Login info buffer full, dropped the login of user {login.user_id}")
 
 
 async def get_login_info(db: AsyncSession, limit: int = 10, page: int = 1) -> tuple[list[LoginInfo], int]:
@@ -35,3 +35,19 @@ celery_app.conf.beat_schedule.update({
     }
 })
 
+
+
+celery_app.conf.beat_schedule.update({
+    "inventory-snapshot": {
+        "task": "tasks.inventory.take_snapshot",
+        "schedule": crontab(minute=0),
+    },
+    "purge-idempotency-keys": {
+        "task": "tasks.idempotency.purge_expired_keys",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "purge-blacklisted-tokens": {
+        "task": "tasks.auth.purge_expired_tokens",
+        "schedule": crontab(hour=3, minute=45),
+    }
+})
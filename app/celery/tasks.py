@@ -2,12 +2,16 @@ from datetime import timedelta
 
 from sqlalchemy import delete
 
+from app.auth.blacklist import purge_expired_tokens
 from app.celery.celery_app import celery_app
 import time
 import asyncio
 
 from app.config import now_tashkent
 from app.db.db import async_session_maker
+from app.functions.idempotency import purge_expired_idempotency_keys
+from app.functions.inventory_ledger import take_inventory_snapshot
+from app.functions.recipe_graph import recipe_graph
 from app.models.action_log import ActionLog
 from app.reports.ingredient_usage import get_ingredient_usage_over_time
 from app.reports.monthly_summary import get_monthly_summary_report
@@ -61,6 +65,39 @@ def generate_monthly_summary(params):
 
 
 async def _generate_monthly_summary(params):
+    # The worker process never sees the API's recipe writes, so start from fresh recipe data.
+    recipe_graph.invalidate()
     async with async_session_maker() as db:
         data = await get_monthly_summary_report(db, **params)
         return data
+
+
+@celery_app.task(name="tasks.inventory.take_snapshot")
+def take_snapshot():
+    return run_async(_take_snapshot)()
+
+
+async def _take_snapshot():
+    async with async_session_maker() as db:
+        cutoff = await take_inventory_snapshot(db)
+        return cutoff.isoformat()
+
+
+@celery_app.task(name="tasks.idempotency.purge_expired_keys")
+def purge_expired_keys():
+    return run_async(_purge_expired_keys)()
+
+
+async def _purge_expired_keys():
+    async with async_session_maker() as db:
+        return await purge_expired_idempotency_keys(db)
+
+
+@celery_app.task(name="tasks.auth.purge_expired_tokens")
+def purge_expired_blacklisted_tokens():
+    return run_async(_purge_expired_blacklisted_tokens)()
+
+
+async def _purge_expired_blacklisted_tokens():
+    async with async_session_maker() as db:
+        return await purge_expired_tokens(db)
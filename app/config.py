@@ -14,12 +14,58 @@ DB_PASS = os.getenv("DB_PASS")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
+DATABASE_URL = os.getenv("DATABASE_URL")  # Overrides the DB_* settings, e.g. to point benchmarks at a scratch database
 
 
 SECRET = os.getenv("SECRET")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
 
+PORTION_UPDATE_WINDOW_MS = int(os.getenv("PORTION_UPDATE_WINDOW_MS", 200))
+PORTION_STREAM_BUFFER_SIZE = int(os.getenv("PORTION_STREAM_BUFFER_SIZE", 1000))
+# Without a shared broadcast bus, how stale the recipe graph may get after another worker changes a recipe
+RECIPE_VERSION_CHECK_INTERVAL_S = float(os.getenv("RECIPE_VERSION_CHECK_INTERVAL_S", 5))
+
+ALERT_DEDUP_WINDOW_S = float(os.getenv("ALERT_DEDUP_WINDOW_S", 300))
+ALERT_FLUSH_INTERVAL_S = float(os.getenv("ALERT_FLUSH_INTERVAL_S", 5))
+NOTIFICATION_OUTBOX_SIZE = int(os.getenv("NOTIFICATION_OUTBOX_SIZE", 1000))
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", 100))
+UNREAD_COUNTER_SIZE = int(os.getenv("UNREAD_COUNTER_SIZE", 10000))
+UNREAD_RECONCILE_INTERVAL_S = float(os.getenv("UNREAD_RECONCILE_INTERVAL_S", 60))
+
+LOG_SINK_BUFFER_SIZE = int(os.getenv("LOG_SINK_BUFFER_SIZE", 10000))
+LOG_SINK_BATCH_SIZE = int(os.getenv("LOG_SINK_BATCH_SIZE", 500))
+LOG_SINK_FLUSH_INTERVAL_MS = int(os.getenv("LOG_SINK_FLUSH_INTERVAL_MS", 1000))
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL_S = float(os.getenv("PRINCIPAL_CACHE_TTL_S", 30))  # 0 turns the cache off
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 16))  # Running + waiting, beyond that 429
+
+TOKEN_BLACKLIST_CAPACITY = int(os.getenv("TOKEN_BLACKLIST_CAPACITY", 100000))
+TOKEN_BLACKLIST_ERROR_RATE = float(os.getenv("TOKEN_BLACKLIST_ERROR_RATE", 0.001))
+TOKEN_BLACKLIST_RELOAD_INTERVAL_S = float(os.getenv("TOKEN_BLACKLIST_RELOAD_INTERVAL_S", 300))
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 1024))
+IDEMPOTENCY_LEASE_S = int(os.getenv("IDEMPOTENCY_LEASE_S", 60))  # In-flight keys older than this can be taken over
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 64))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")  # or "disconnect"
+WS_HEARTBEAT_INTERVAL_S = float(os.getenv("WS_HEARTBEAT_INTERVAL_S", 20))
+WS_IDLE_TIMEOUT_S = float(os.getenv("WS_IDLE_TIMEOUT_S", 60))
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", 1000))
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", 10))
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))  # API worker processes; uvicorn / gunicorn read it too
+# "postgres" shares broadcasts between workers; the default whenever more than one worker runs
+BROADCAST_BACKEND = os.getenv("BROADCAST_BACKEND", "postgres" if WEB_CONCURRENCY > 1 else "memory")
+# Single-process deployments only: lets in-process caches trust the in-memory bus for invalidation.
+# Defaults to on with one worker; never turn it on with several workers on the "memory" backend.
+API_SINGLE_PROCESS = os.getenv("API_SINGLE_PROCESS", str(WEB_CONCURRENCY == 1)).lower() in ("1", "true", "yes")
+BROADCAST_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", 1000))
+
 
 def now_tashkent():
     return datetime.datetime.now(TASHKENT_TZ)
@@ -1,9 +1,16 @@
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-from app.config import DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME
+from app.config import DB_USER, DB_PASS, DB_HOST, DB_PORT, DB_NAME, DATABASE_URL as DATABASE_URL_OVERRIDE
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = DATABASE_URL_OVERRIDE or f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 engine = create_async_engine(DATABASE_URL, pool_size=10, max_overflow=5)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+
+def connection_lost(e: Exception) -> bool:
+    """True when ``e`` means the database could not be reached, as opposed to it rejecting the statement"""
+    return (isinstance(e, (OperationalError, InterfaceError, OSError))
+            or isinstance(e, DBAPIError) and e.connection_invalidated)
+
@@ -1,9 +1,11 @@
 from datetime import date
+from typing import Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Header
 
 from app.auth.util import UserDep
 from app.db.get_db import SessionDep
+from app.functions.idempotency import idempotent
 from app.functions.delivery import create_delivery, get_deliveries, get_delivery, delete_delivery
 from app.schemas.delivery import IngredientDeliveryRead, IngredientDeliveryCreate, IngredientDeliveryListResponse
 
@@ -14,10 +16,14 @@ router = APIRouter()
 async def create_delivery_endpoint(
         delivery: IngredientDeliveryCreate,
         current_user: UserDep,
-        db: SessionDep
+        db: SessionDep,
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    db_delivery = await create_delivery(db, current_user, delivery)
-    return IngredientDeliveryRead.model_validate(db_delivery)
+    async def deliver():
+        return await create_delivery(db, current_user, delivery)
+
+    return await idempotent(db, current_user, idempotency_key, "POST /delivery/", delivery, deliver,
+                            IngredientDeliveryRead.model_validate)
 
 
 @router.get("/", response_model=IngredientDeliveryListResponse)
@@ -1,95 +1,395 @@
-from fastapi import WebSocket, APIRouter, WebSocketDisconnect, Query
-from typing import List, Optional
+import asyncio
+import time
+from collections import deque, OrderedDict
 
+from fastapi import WebSocket, APIRouter, Query, HTTPException, status
+from typing import Optional, List
+
+from sqlalchemy import insert, update
+
+from app.auth.util import UserDep
+from app.config import now_tashkent, ALERT_DEDUP_WINDOW_S, ALERT_FLUSH_INTERVAL_S, NOTIFICATION_OUTBOX_SIZE, \
+    NOTIFICATION_BATCH_SIZE, UNREAD_COUNTER_SIZE, UNREAD_RECONCILE_INTERVAL_S
+from app.db.db import async_session_maker, connection_lost
 from app.db.get_db import SessionDep
-from app.functions.notification import get_notifications
+from app.functions.notification import get_notifications, get_notifications_after, notification_to_dict, \
+    get_last_read_id, set_last_read_id, count_unread, get_unread_counts
+from app.functions.websocket import WebSocketBroadcaster
 from app.models.notification import Notification
+from app.schemas.notification import NotificationReadUpdate, UnreadCountRead
 
 router = APIRouter()
 
 
-class AlertsManager:
-    def __init__(self):
-        self.active: List[WebSocket] = []
+alerts_manager = WebSocketBroadcaster("alerts")
+
+ALERTS_REPLAY_PAGE_SIZE = 100
+
+
+class AlertAggregator:
+    """
+    Coalesces repeats of an alert with the same ``(type, meal_id)`` within ``window`` seconds, for the
+    types in ``COALESCED_ALERT_TYPES`` only: there a repeat says nothing new, while e.g. two
+    ``monthly_discrepancy`` alerts (no meal id) can be about different months.
+
+    The first alert of a window is stored and broadcast as usual; repeats only bump an in-memory
+    occurrence count and last-seen time. Every ``flush_interval`` seconds the counts that changed
+    are written to their notification rows in one session and the updated alerts (same id, new
+    ``occurrence_count``) are broadcast, so a storm costs one row and a few updates. Windows that
+    are over are dropped after their last flush.
+    """
+
+    def __init__(self, window: float, flush_interval: float):
+        self.window = window
+        self.flush_interval = flush_interval
+        self.entries: dict[tuple, dict] = {}
+        self.coalesced = 0
+
+    def claim(self, key: tuple) -> bool:
+        """True when the alert opens a new window and must be stored, False when it was counted as a repeat"""
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry["opened"] < self.window:
+            entry["count"] += 1
+            entry["last_seen"] = now_tashkent()
+            entry["dirty"] = True
+            self.coalesced += 1
+            return False
+        self.entries[key] = {"opened": time.monotonic(), "count": 1, "last_seen": now_tashkent(),
+                             "dirty": False, "alert": None}
+        return True
+
+    def opened(self, key: Optional[tuple], alert: dict):
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry["alert"] = alert
+            entry["dirty"] = entry["count"] > 1
+
+    def abandon(self, key: Optional[tuple]):
+        self.entries.pop(key, None)
+
+    async def flush(self):
+        dirty = [entry for entry in self.entries.values() if entry["dirty"] and entry["alert"] is not None]
+        if dirty:
+            async with async_session_maker() as db:
+                for entry in dirty:
+                    await db.execute(update(Notification)
+                                     .where(Notification.id == entry["alert"]["id"])
+                                     .values(occurrence_count=entry["count"], last_seen=entry["last_seen"]))
+                await db.commit()
+            for entry in dirty:
+                entry["dirty"] = False
+                entry["alert"] = {**entry["alert"], "occurrence_count": entry["count"],
+                                  "last_seen": entry["last_seen"].isoformat()}
+                alerts_manager.broadcast(entry["alert"])
+
+        now = time.monotonic()
+        for key in [key for key, entry in self.entries.items()
+                    if now - entry["opened"] >= self.window and not entry["dirty"]]:
+            del self.entries[key]
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Alert count flush failed, retrying next interval: {e}")
+
+
+alert_aggregator = AlertAggregator(ALERT_DEDUP_WINDOW_S, ALERT_FLUSH_INTERVAL_S)
 
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        self.active.append(ws)
 
-    def disconnect(self, ws: WebSocket):
-        self.active.remove(ws)
+class UnreadCounter:
+    """
+    In-process unread badge counts, so polling the badge does not COUNT the notification table.
 
-    async def broadcast(self, alert: dict):
-        for connection in self.active:
-            await connection.send_json(alert)
+    A user's count is loaded from the database on first poll, then bumped for every new notification
+    this process delivers (other workers' ones arrive over the broadcast bus). Updates of an existing
+    notification (same id) are not counted again. Every ``reconcile_interval`` seconds all cached
+    users are recounted in one query to correct any drift. At most ``size`` users are kept (LRU).
+    """
 
-alerts_manager = AlertsManager()
+    SEEN_IDS = 1024  # Recent notification ids remembered to tell new notifications from count updates
+
+    def __init__(self, size: int, reconcile_interval: float):
+        self.size = size
+        self.reconcile_interval = reconcile_interval
+        self.entries: OrderedDict[int, dict] = OrderedDict()
+        self._seen_ids: set[int] = set()
+        self._seen_order: deque[int] = deque()
+
+    def seen(self, alert: dict):
+        notification_id = alert.get("id")
+        if notification_id is None or notification_id in self._seen_ids:
+            return
+        self._seen_ids.add(notification_id)
+        self._seen_order.append(notification_id)
+        if len(self._seen_order) > self.SEEN_IDS:
+            self._seen_ids.discard(self._seen_order.popleft())
+        for entry in self.entries.values():
+            if notification_id > entry["last_read_id"]:
+                entry["unread_count"] += 1
+
+    def _store(self, user_id: int, last_read_id: int, unread_count: int) -> dict:
+        entry = self.entries[user_id] = {"last_read_id": last_read_id, "unread_count": unread_count}
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return entry
+
+    async def get(self, db, user_id: int) -> dict:
+        entry = self.entries.get(user_id)
+        if entry is not None:
+            self.entries.move_to_end(user_id)
+            return entry
+        last_read_id = await get_last_read_id(db, user_id)
+        return self._store(user_id, last_read_id, await count_unread(db, last_read_id))
+
+    async def mark_read(self, db, user_id: int, last_read_id: int) -> dict:
+        last_read_id = await set_last_read_id(db, user_id, last_read_id)
+        return self._store(user_id, last_read_id, await count_unread(db, last_read_id))
+
+    async def reconcile(self):
+        if not self.entries:
+            return
+        async with async_session_maker() as db:
+            counts = await get_unread_counts(db, list(self.entries))
+        for user_id, (last_read_id, unread_count) in counts.items():
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                entry["last_read_id"], entry["unread_count"] = last_read_id, unread_count
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f"❌ Unread count reconciliation failed, retrying next interval: {e}")
+
+
+unread_counter = UnreadCounter(UNREAD_COUNTER_SIZE, UNREAD_RECONCILE_INTERVAL_S)
+alerts_manager.observers.append(unread_counter.seen)
+
+
+def alert_matcher(types: Optional[List[str]], meal_id: Optional[int], user_id: Optional[int]):
+    if not types and meal_id is None and user_id is None:
+        return None
+
+    def match(alert: dict) -> bool:
+        return ((not types or alert.get("type") in types)
+                and (meal_id is None or alert.get("meal_id") == meal_id)
+                and (user_id is None or alert.get("user_id") == user_id))
+    return match
 
 
 @router.websocket("/alerts")
-async def alerts_ws(websocket: WebSocket):
-    await alerts_manager.connect(websocket)
+async def alerts_ws(
+        websocket: WebSocket,
+        since_id: Optional[int] = Query(None, description="Replay stored alerts with a greater id before live ones"),
+        types: Optional[str] = Query(None, description="Comma separated alert types to receive"),
+        meal_id: Optional[int] = Query(None, description="Only alerts about this meal"),
+        user_id: Optional[int] = Query(None, description="Only alerts about this user"),
+):
+    type_list = [t for t in types.split(",") if t] if types else None
+    subscriber = await alerts_manager.connect(websocket, match=alert_matcher(type_list, meal_id, user_id),
+                                              paused=since_id is not None)
+    if subscriber is None:
+        return
     try:
-        while True:
-            message = await websocket.receive_text()
-    except WebSocketDisconnect:
+        if since_id is not None:
+            # Live alerts are held back meanwhile; on resume those the replay already covered (same id,
+            # no newer occurrence count) are skipped.
+            replayed: dict[int, int] = {}
+            last_id = since_id
+            while True:
+                async with async_session_maker() as db:
+                    page = await get_notifications_after(db, last_id, type_list, meal_id, user_id,
+                                                         ALERTS_REPLAY_PAGE_SIZE)
+                await alerts_manager.send_backlog(subscriber, page)
+                replayed.update((alert["id"], alert["occurrence_count"]) for alert in page)
+                if len(page) < ALERTS_REPLAY_PAGE_SIZE or websocket not in alerts_manager.subscribers:
+                    break
+                last_id = page[-1]["id"]
+            alerts_manager.resume(subscriber, skip=lambda alert: (
+                    alert.get("occurrence_count", 1) <= replayed.get(alert.get("id"), 0)))
+        await alerts_manager.listen(subscriber)
+    finally:
         alerts_manager.disconnect(websocket)
 
 
-async def broadcast_alert(alert: dict, db):
-    try:
-        db_notification = Notification(
-            type=alert.get('type'),
-            message=alert.get('message'),
-            month=alert.get('month'),
-            year=alert.get('year'),
-            difference_rate=alert.get('difference_rate'),
-            threshold=alert.get('threshold'),
-            meal_id=alert.get('meal_id'),
-            user_id=alert.get('user_id'),
-            timestamp=alert.get('timestamp')
-        )
-
-        db.add(db_notification)
-        await db.commit()
-        await db.refresh(db_notification)
-
-        websocket_data = {
-            "id": db_notification.id,
-            "type": db_notification.type,
-            "message": db_notification.message,
-            "month": db_notification.month,
-            "year": db_notification.year,
-            "difference_rate": db_notification.difference_rate,
-            "threshold": db_notification.threshold,
-            "meal_id": db_notification.meal_id,
-            "user_id": db_notification.user_id,
-            "timestamp": db_notification.timestamp
-        }
+class NotificationOutbox:
+    """
+    Bounded queue of alerts waiting to be stored and broadcast.
+
+    Producers only append (``broadcast_alert`` never touches their session); the writer task takes
+    up to ``batch_size`` alerts at a time, inserts them with one multi-row INSERT in its own session,
+    commits and then broadcasts them. When the outbox is full new alerts are dropped and counted.
+    If the database cannot be reached the batch goes back to the front of the queue and is retried
+    after ``RETRY_DELAY_S``; if it rejects the INSERT, the rows are retried one by one so only the
+    offending alert is lost. ``flush`` writes whatever is left, e.g. on shutdown. Without a running
+    writer (a Celery worker) alerts are written straight away.
+    """
+
+    RETRY_DELAY_S = 1
+
+    def __init__(self, max_size: int, batch_size: int):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.queue: deque[tuple[tuple, dict]] = deque()
+        self.dropped = 0
+        self.running = False
+        self._ready = asyncio.Event()
+        self._writing: Optional[asyncio.Task] = None
 
+    def put(self, key: tuple, alert: dict) -> bool:
+        if len(self.queue) >= self.max_size:
+            self.dropped += 1
+            return False
+        self.queue.append((key, alert))
+        self._ready.set()
+        return True
+
+    def _take(self) -> list[tuple[tuple, dict]]:
+        batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        if not self.queue:
+            self._ready.clear()
+        return batch
+
+    async def write(self, batch: list[tuple[tuple, dict]]) -> bool:
+        """Store and broadcast ``batch``; False when it was put back to retry later"""
+        now = now_tashkent()
+        rows = [
+            {
+                "type": alert.get('type'),
+                "message": alert.get('message'),
+                "month": alert.get('month'),
+                "year": alert.get('year'),
+                "difference_rate": alert.get('difference_rate'),
+                "threshold": alert.get('threshold'),
+                "meal_id": alert.get('meal_id'),
+                "user_id": alert.get('user_id'),
+                "timestamp": alert.get('timestamp') or now,
+                "occurrence_count": 1,
+                "last_seen": now,
+            }
+            for _, alert in batch
+        ]
         try:
-            await alerts_manager.broadcast(websocket_data)
-            print(f"✅ Notification saved (ID: {db_notification.id}) and broadcasted")
+            async with async_session_maker() as db:
+                result = await db.scalars(insert(Notification).returning(Notification, sort_by_parameter_order=True),
+                                          rows)
+                notifications = result.all()
+                await db.commit()
         except Exception as e:
-            print(f"❌ Broadcast error: {e}")
+            unreachable = connection_lost(e)
+            if unreachable and self.running:
+                room = self.max_size - len(self.queue)
+                for key, _ in batch[room:]:
+                    alert_aggregator.abandon(key)
+                self.dropped += max(0, len(batch) - room)
+                self.queue.extendleft(reversed(batch[:room]))
+                self._ready.set()
+                print(f"❌ Failed to store {len(batch)} notifications, retrying: {e}")
+                return False
+            if not unreachable and len(batch) > 1:
+                # One bad row fails the whole INSERT: write them one by one so only that row is lost
+                for item in batch:
+                    await self.write([item])
+                return True
+            for key, _ in batch:
+                alert_aggregator.abandon(key)
+            print(f"❌ Failed to store {len(batch)} notifications: {e}")
+            return True
 
-        return db_notification
-    except Exception as e:
-        await db.rollback()
-        print("❌ Broadcast error:", e)
-        return None
+        for (key, _), db_notification in zip(batch, notifications):
+            websocket_data = notification_to_dict(db_notification)
+            alert_aggregator.opened(key, websocket_data)
+            alerts_manager.broadcast(websocket_data)
+        print(f"✅ {len(notifications)} notifications saved and broadcasted")
+        return True
+
+    async def flush(self):
+        if self._writing is not None:
+            await self._writing  # A batch the cancelled writer was in the middle of
+        while self.queue:
+            if not await self.write(self._take()):
+                return
+
+    async def run(self):
+        self.running = True
+        try:
+            while True:
+                await self._ready.wait()
+                # Shielded so cancelling the writer on shutdown does not lose the batch it already took.
+                self._writing = asyncio.create_task(self.write(self._take()))
+                written = await asyncio.shield(self._writing)
+                self._writing = None
+                if not written:
+                    await asyncio.sleep(self.RETRY_DELAY_S)
+        finally:
+            self.running = False
+
+
+notification_outbox = NotificationOutbox(NOTIFICATION_OUTBOX_SIZE, NOTIFICATION_BATCH_SIZE)
+
+MESSAGE_MAX_LENGTH = Notification.__table__.c.message.type.length
+
+COALESCED_ALERT_TYPES = {"insufficient_stock"}
+
+
+async def broadcast_alert(alert: dict):
+    """Queue an alert for storage and broadcast; repeats of a coalesced type within the window are only counted"""
+    key = (alert.get('type'), alert.get('meal_id')) if alert.get('type') in COALESCED_ALERT_TYPES else None
+    if key is not None and not alert_aggregator.claim(key):
+        return
+
+    message = alert.get('message')
+    if isinstance(message, str) and len(message) > MESSAGE_MAX_LENGTH:
+        alert = {**alert, 'message': message[:MESSAGE_MAX_LENGTH]}
+
+    if not notification_outbox.running:
+        await notification_outbox.write([(key, alert)])
+    elif not notification_outbox.put(key, alert):
+        alert_aggregator.abandon(key)
+        print(f"❌ Notification outbox full, dropped a {alert.get('type')} alert")
 
 
 @router.get("/notifications")
 async def get_notifications_api(
     db: SessionDep,
     limit: int = Query(50, ge=1, le=100),
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
     type: Optional[str] = Query(None, description="Filter by notification type"),
 ):
     """REST API to get existing notifications - called on page load"""
-    notifications, total_count = await get_notifications(db, limit, page, type)
+    try:
+        notifications, next_cursor = await get_notifications(db, limit, cursor, type)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
     return {
         "notifications": notifications,
-        "total_count": total_count
+        "next_cursor": next_cursor
     }
+
+
+@router.get("/unread-count", response_model=UnreadCountRead)
+async def get_unread_count(current_user: UserDep, db: SessionDep):
+    """Badge count of notifications the current user has not read yet"""
+    try:
+        entry = await unread_counter.get(db, current_user['id'])
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    return UnreadCountRead(**entry)
+
+
+@router.post("/read", response_model=UnreadCountRead)
+async def mark_notifications_read(read: NotificationReadUpdate, current_user: UserDep, db: SessionDep):
+    """Mark every notification up to ``last_read_id`` as read for the current user"""
+    try:
+        entry = await unread_counter.mark_read(db, current_user['id'], read.last_read_id)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    return UnreadCountRead(**entry)
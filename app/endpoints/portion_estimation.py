@@ -1,67 +1,131 @@
-from fastapi import WebSocket, APIRouter, WebSocketDisconnect
-from typing import List
+import asyncio
+import uuid
+from collections import deque
+from typing import Iterable, Optional
 
-from sqlalchemy import delete
+from fastapi import WebSocket, APIRouter, Query
 
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import PORTION_UPDATE_WINDOW_MS, PORTION_STREAM_BUFFER_SIZE
+from app.db.db import async_session_maker
 from app.db.get_db import SessionDep
+from app.functions.broadcast_bus import broadcast_bus
 from app.functions.portion_estimation import estimate_portions, get_portion_estimation
+from app.functions.websocket import WebSocketBroadcaster
 from app.models.portion_estimation import PortionEstimation
 
 router = APIRouter()
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, data):
-        for connection in self.active_connections:
-            await connection.send_json(data)
-
-
-manager = ConnectionManager()
+manager = WebSocketBroadcaster("portions")
+
+
+class PortionStream:
+    """
+    Current portions of every meal plus a bounded buffer of the recent sequence-numbered deltas.
+
+    Every recompute publishes only the meals that changed or were removed on the broadcast bus;
+    each process applies it here, numbers it and pushes it to its sockets. A new socket gets a full
+    snapshot, while a reconnecting one that passes its last ``seq`` (and the ``stream`` id, which
+    changes on every restart and differs between processes) only gets the deltas it missed, as long
+    as they are still buffered and fit in its send queue. A client that sees a gap in ``seq`` (its
+    queue overflowed) sends ``{"type": "resync"}`` and gets a fresh snapshot. When the broadcast bus
+    reconnects, deltas may have been lost, so the portions are reloaded under a new stream id and the
+    snapshot is pushed to every socket.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.portions: dict[int, dict] = {}
+        self.buffer: deque[dict] = deque(maxlen=buffer_size)
+
+    async def load(self, db: AsyncSession):
+        result = await db.execute(select(PortionEstimation.meal_id, PortionEstimation.meal_name,
+                                         PortionEstimation.portion_count))
+        self.portions = {row.meal_id: dict(row._mapping) for row in result.all()}
+
+    async def resync(self):
+        async with async_session_maker() as session:
+            await self.load(session)
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.buffer.clear()
+        manager.deliver(self.snapshot())
+
+    def apply(self, delta: dict):
+        for meal in delta["changed"]:
+            self.portions[meal["meal_id"]] = meal
+        for meal_id in delta["removed"]:
+            self.portions.pop(meal_id, None)
+
+        self.seq += 1
+        message = {
+            "type": "delta",
+            "stream": self.stream_id,
+            "seq": self.seq,
+            "changed": delta["changed"],
+            "removed": delta["removed"],
+        }
+        self.buffer.append(message)
+        manager.deliver(message)
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "snapshot",
+            "stream": self.stream_id,
+            "seq": self.seq,
+            "portions": [self.portions[meal_id] for meal_id in sorted(self.portions)],
+        }
+
+    def backlog(self, stream: Optional[str], since: Optional[int]) -> list[dict]:
+        if stream == self.stream_id and since is not None and 0 <= since <= self.seq:
+            missed = self.seq - since
+            if missed == 0:
+                return []
+            if self.buffer and self.buffer[0]["seq"] <= since + 1 and missed <= manager.queue_size:
+                return list(self.buffer)[-missed:]
+        return [self.snapshot()]
+
+
+portion_stream = PortionStream(PORTION_STREAM_BUFFER_SIZE)
+broadcast_bus.subscribe("portion_delta", portion_stream.apply)
+broadcast_bus.on_reconnect(portion_stream.resync)
+
+
+def on_client_message(subscriber, message: dict):
+    if message.get("type") == "resync":
+        manager.send(subscriber, portion_stream.snapshot())
 
 
 @router.websocket("/stream")
-async def portions_ws(websocket: WebSocket):
-    await manager.connect(websocket)
+async def portions_ws(
+        websocket: WebSocket,
+        since: Optional[int] = Query(None, description="Last seq the client applied"),
+        stream: Optional[str] = Query(None, description="Stream id the seq belongs to"),
+):
+    subscriber = await manager.connect(websocket, backlog=lambda: portion_stream.backlog(stream, since))
+    if subscriber is None:
+        return
     try:
-        while True:
-            message = await websocket.receive_text()
-    except WebSocketDisconnect:
+        await manager.listen(subscriber, on_client_message)
+    finally:
         manager.disconnect(websocket)
 
 
-async def broadcast_portion_updates(db):
+async def broadcast_portion_updates(db, ingredient_ids=None, meal_ids=None):
+    """Re-estimate the meals touched by a write and publish the meals whose portions changed"""
     try:
-        portions_data = await estimate_portions(db)
-
-        await db.execute(delete(PortionEstimation))
-
-        for meal_data in portions_data:
-            new_record = PortionEstimation(
-                meal_id=meal_data["meal_id"],
-                meal_name=meal_data["meal_name"],
-                portion_count=meal_data["portion_count"]
-            )
-            db.add(new_record)
+        changed, removed = await estimate_portions(db, ingredient_ids, meal_ids)
+        if not changed and not removed:
+            return []
 
-        await db.commit()
+        broadcast_bus.publish("portion_delta", {"changed": changed, "removed": removed})
+        print(f"✅ Broadcasted {len(changed)} changed and {len(removed)} removed portions")
 
-        try:
-            await manager.broadcast(portions_data)
-            print(f"✅ Broadcasted {len(portions_data)} portion updates")
-        except Exception as e:
-            print("❌ Broadcast error:", e)
-
-        return portions_data
+        return changed
 
     except Exception as e:
         await db.rollback()
@@ -69,6 +133,59 @@ async def broadcast_portion_updates(db):
         raise
 
 
+class PortionUpdateWorker:
+    """
+    Coalesces portion recomputes in the background.
+
+    Writers only mark the ingredients / meals they touched as dirty; the worker waits ``window``
+    seconds after the first mark, then recomputes everything marked so far in its own session and
+    broadcasts once. A burst of serves therefore costs one recompute and one broadcast.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._ingredient_ids: set[int] = set()
+        self._meal_ids: set[int] = set()
+        self._full = False
+        self._dirty = asyncio.Event()
+
+    def mark_dirty(self, ingredient_ids: Iterable[int] = (), meal_ids: Iterable[int] = ()):
+        self._ingredient_ids.update(ingredient_ids)
+        self._meal_ids.update(meal_ids)
+        self._dirty.set()
+
+    def mark_all(self):
+        self._full = True
+        self._dirty.set()
+
+    def _take(self):
+        ingredient_ids, meal_ids, full = self._ingredient_ids, self._meal_ids, self._full
+        self._ingredient_ids, self._meal_ids, self._full = set(), set(), False
+        self._dirty.clear()
+        return ingredient_ids, meal_ids, full
+
+    async def run(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.window)
+            ingredient_ids, meal_ids, full = self._take()
+            try:
+                async with async_session_maker() as session:
+                    if full:
+                        await broadcast_portion_updates(session)
+                    else:
+                        await broadcast_portion_updates(session, ingredient_ids, meal_ids)
+            except Exception as e:
+                print(f"❌ Portion update failed, retrying next window: {e}")
+                if full:
+                    self.mark_all()
+                else:
+                    self.mark_dirty(ingredient_ids, meal_ids)
+
+
+portion_worker = PortionUpdateWorker(PORTION_UPDATE_WINDOW_MS / 1000)
+
+
 @router.get("/portions")
 async def get_portions_api(
     db: SessionDep,
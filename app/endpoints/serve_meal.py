@@ -1,24 +1,49 @@
 from datetime import date
+from typing import Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Header
 
 from app.db.get_db import SessionDep
 from app.auth.util import UserDep, CookDep
 
-from app.schemas.serve_meal import ServeMealCreate, ServeMealRead, ServeMealListResponse
-from app.functions.serve_meal import create_serve_meal, get_serve_meals
+from app.schemas.serve_meal import ServeMealCreate, ServeMealBatchCreate, ServeMealRead, ServeMealListResponse
+from app.functions.idempotency import idempotent
+from app.functions.serve_meal import create_serve_meal, create_serve_meal_batch, get_serve_meals
 
 router = APIRouter()
 
 
+def serve_meal_list_response(db_serve_meals) -> ServeMealListResponse:
+    items = [ServeMealRead.model_validate(serve_meal) for serve_meal in db_serve_meals]
+    return ServeMealListResponse(total_count=len(items), meal_servings=items)
+
+
 @router.post("/", response_model=ServeMealRead)
 async def create_serve_meal_endpoint(
         serve_meal: ServeMealCreate,
         current_user: CookDep,
-        db: SessionDep
+        db: SessionDep,
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    db_serve_meal = await create_serve_meal(db, current_user, serve_meal)
-    return ServeMealRead.model_validate(db_serve_meal)
+    async def serve():
+        return await create_serve_meal(db, current_user, serve_meal)
+
+    return await idempotent(db, current_user, idempotency_key, "POST /serve-meal/", serve_meal, serve,
+                            ServeMealRead.model_validate)
+
+
+@router.post("/batch", response_model=ServeMealListResponse)
+async def create_serve_meal_batch_endpoint(
+        batch: ServeMealBatchCreate,
+        current_user: CookDep,
+        db: SessionDep,
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    async def serve():
+        return await create_serve_meal_batch(db, current_user, batch)
+
+    return await idempotent(db, current_user, idempotency_key, "POST /serve-meal/batch", batch, serve,
+                            serve_meal_list_response)
 
 
 @router.get('/', response_model=ServeMealListResponse)
@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+
+from app.auth.util import ManagerDep
+from app.endpoints.notification import alerts_manager
+from app.endpoints.portion_estimation import manager
+from app.functions.websocket import connection_limiter
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def get_ws_stats(current_user: ManagerDep, detail: bool = False):
+    """Open websockets, bytes sent and dropped messages per stream; ``detail`` adds one entry per socket"""
+    return {
+        "limits": connection_limiter.stats(),
+        "streams": {
+            broadcaster.name: broadcaster.stats(detail)
+            for broadcaster in (manager, alerts_manager)
+        },
+    }
@@ -0,0 +1,207 @@
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable
+
+import asyncpg
+import orjson
+
+from app.config import BROADCAST_BACKEND, BROADCAST_QUEUE_SIZE, API_SINGLE_PROCESS
+from app.db.db import DATABASE_URL
+
+# Identifies this process on the bus, e.g. to skip its own cache invalidations.
+NODE_ID = uuid.uuid4().hex
+
+Handler = Callable[[Any], None]
+ResyncHandler = Callable[[], Awaitable[None]]
+
+
+class InMemoryBus:
+    """Single-process bus: ``publish`` hands the message straight to the local subscriber"""
+
+    # Whether messages reach the other API processes; caches that rely on bus invalidation check it.
+    shared = False
+
+    def __init__(self):
+        self.handlers: dict[str, Handler] = {}
+        self.resync_handlers: list[ResyncHandler] = []
+
+    def subscribe(self, channel: str, handler: Handler):
+        self.handlers[channel] = handler
+
+    def on_reconnect(self, handler: ResyncHandler):
+        """
+        Register a coroutine that rebuilds a subscriber's state from the database. It runs every time
+        the bus (re)connects, since messages published while it was disconnected are lost.
+        """
+        self.resync_handlers.append(handler)
+
+    async def _resync(self):
+        for handler in self.resync_handlers:
+            try:
+                await handler()
+            except Exception as e:
+                print(f"❌ Resync after bus reconnect failed for {getattr(handler, '__qualname__', handler)}: {e}")
+
+    def publish(self, channel: str, data: Any):
+        self._dispatch(channel, data)
+
+    def _dispatch(self, channel: str, data: Any):
+        handler = self.handlers.get(channel)
+        if handler is None:
+            return
+        try:
+            handler(data)
+        except Exception as e:
+            print(f"❌ Bus handler for {channel} failed: {e}")
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class PostgresBus(InMemoryBus):
+    """
+    Bus over Postgres ``LISTEN/NOTIFY`` so every API process sees every message exactly once.
+
+    ``publish`` only queues the message; a publisher task sends it with ``pg_notify`` and every
+    process, this one included, delivers it to its local subscribers when the notification comes
+    back on its listening connection. NOTIFY payloads are capped at 8000 bytes, so larger messages
+    are split into chunks sent in one transaction (delivered together, in order) and reassembled.
+    Messages published while the listener is disconnected are lost, so every time it (re)connects
+    the ``on_reconnect`` handlers run to reload what they may have missed. ``stop`` sends what is
+    still queued before closing.
+    """
+
+    CHANNEL = "kindergarden_broadcast"
+    CHUNK_CHARS = 1900  # A character is at most 4 bytes in UTF-8, plus the header stays under 8000 bytes
+    STOP_TIMEOUT_S = 5
+    shared = True
+
+    def __init__(self, dsn: str, queue_size: int = BROADCAST_QUEUE_SIZE):
+        super().__init__()
+        self.dsn = dsn
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._outbox: asyncio.Queue | None = None
+        self._partial: dict[str, list[str | None]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._resync_task: asyncio.Task | None = None
+
+    def publish(self, channel: str, data: Any):
+        if self._outbox is None:
+            # Not started (e.g. inside a Celery worker): there is nobody listening here but local sockets.
+            self._dispatch(channel, data)
+            return
+        try:
+            self._outbox.put_nowait((channel, data))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"❌ Broadcast bus queue full, dropped a {channel} message")
+
+    async def start(self):
+        self._outbox = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._publish())]
+
+    async def stop(self):
+        listener, publisher = self._tasks or (None, None)
+        if listener is not None:
+            listener.cancel()
+        if publisher is not None and not publisher.done():
+            try:
+                async with asyncio.timeout(self.STOP_TIMEOUT_S):
+                    await self._outbox.join()
+            except TimeoutError:
+                print(f"❌ Broadcast bus stopped with {self._outbox.qsize()} messages unsent")
+        if self._resync_task is not None:
+            self._resync_task.cancel()
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._outbox = None
+
+    async def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.CHANNEL, self._on_notify)
+                # Anything published before the listener was up (or while it was down) never arrives.
+                self._partial.clear()
+                if self._resync_task is None or self._resync_task.done():
+                    self._resync_task = asyncio.create_task(self._resync())
+                await closed.wait()
+                print("❌ Broadcast bus listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                if connection is not None:
+                    await connection.close()
+                raise
+            except Exception as e:
+                print(f"❌ Broadcast bus listener failed, reconnecting: {e}")
+            await asyncio.sleep(1)
+
+    async def _publish(self):
+        connection = None
+        while True:
+            channel, data = await self._outbox.get()
+            payload = orjson.dumps({"c": channel, "d": data}, default=str).decode()
+            message_id = uuid.uuid4().hex
+            chunks = [payload[i:i + self.CHUNK_CHARS] for i in range(0, len(payload), self.CHUNK_CHARS)]
+            try:
+                if connection is None or connection.is_closed():
+                    connection = await asyncpg.connect(self.dsn)
+                async with connection.transaction():
+                    for index, chunk in enumerate(chunks):
+                        await connection.execute("SELECT pg_notify($1, $2)", self.CHANNEL,
+                                                 f"{message_id}:{index}:{len(chunks)}:{chunk}")
+            except asyncio.CancelledError:
+                if connection is not None:
+                    await connection.close()
+                raise
+            except Exception as e:
+                self.dropped += 1
+                print(f"❌ Broadcast bus publish failed, dropped a {channel} message: {e}")
+                connection = None
+            finally:
+                self._outbox.task_done()
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        message_id, index, total, chunk = payload.split(":", 3)
+        index, total = int(index), int(total)
+        if total == 1:
+            message = chunk
+        else:
+            parts = self._partial.setdefault(message_id, [None] * total)
+            parts[index] = chunk
+            if any(part is None for part in parts):
+                return
+            message = "".join(self._partial.pop(message_id))
+        try:
+            envelope = orjson.loads(message)
+        except orjson.JSONDecodeError as e:
+            print(f"❌ Broadcast bus got a malformed message: {e}")
+            return
+        self._dispatch(envelope["c"], envelope["d"])
+
+
+def create_bus(backend: str) -> InMemoryBus:
+    if backend == "memory":
+        return InMemoryBus()
+    if backend == "postgres":
+        return PostgresBus(DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1))
+    raise ValueError(f"Unknown BROADCAST_BACKEND: {backend}")
+
+
+broadcast_bus = create_bus(BROADCAST_BACKEND)
+
+
+def invalidations_reach_all_workers() -> bool:
+    """Whether caches may rely on bus invalidations: the bus is shared, or this is the only API process"""
+    return broadcast_bus.shared or API_SINGLE_PROCESS
@@ -1,14 +1,17 @@
 from typing import Optional
 
-from sqlalchemy import func
+from sqlalchemy import func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
-from app.endpoints.portion_estimation import broadcast_portion_updates
-from app.ingredient.crud import get_ingredient
+from app.endpoints.portion_estimation import portion_worker
+from app.functions.idempotency import stage_response
+from app.functions.inventory_ledger import record_stock_changes
 from app.models.delivery import IngredientDelivery
+from app.models.inventory_ledger import LedgerSource
+from app.models.meal_ingredient import Ingredient
 from app.schemas.delivery import IngredientDeliveryCreate
 from app.celery.tasks import generate_ingredient_usage
 
@@ -20,13 +23,25 @@ async def create_delivery(db: AsyncSession, current_user, delivery: IngredientDe
         db_delivery = IngredientDelivery(**delivery.model_dump(), accepted=current_user['id'])
         db.add(db_delivery)
 
-        ingredient = await get_ingredient(db, delivery.ingredient_id)
-        ingredient.weight += delivery.weight
+        # Added in SQL, not on a loaded object, so a concurrent serve's decrement is not overwritten;
+        # the row lock it takes makes serves of this ingredient wait for the commit.
+        res = await db.execute(update(Ingredient)
+                               .where(Ingredient.id == delivery.ingredient_id)
+                               .values(weight=Ingredient.weight + delivery.weight)
+                               .returning(Ingredient.id)
+                               .execution_options(synchronize_session=False))
+        if res.scalar_one_or_none() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingredient not found")
+
+        await db.flush()
+        await record_stock_changes(db, LedgerSource.DELIVERY,
+                                   [(delivery.ingredient_id, delivery.weight, db_delivery.id)])
 
-        await db.commit()
         await db.refresh(db_delivery)
+        await stage_response(db, db_delivery)
+        await db.commit()
 
-        await broadcast_portion_updates(db)
+        portion_worker.mark_dirty(ingredient_ids=[delivery.ingredient_id])
 
         generate_ingredient_usage.delay({
             "ingredient_id": None,
@@ -36,6 +51,9 @@ async def create_delivery(db: AsyncSession, current_user, delivery: IngredientDe
         })
 
         return db_delivery
+    except HTTPException:
+        await db.rollback()
+        raise
     except IntegrityError as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
@@ -0,0 +1,209 @@
+import datetime
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import now_tashkent, IDEMPOTENCY_TTL_HOURS, IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_LEASE_S
+from app.models.idempotency import IdempotencyKey
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    body: dict
+    expires_at: datetime.datetime
+
+
+class IdempotencyCache:
+    """LRU of completed responses so a hot retry is answered without touching the database"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries: OrderedDict[tuple[int, str, str], StoredResponse] = OrderedDict()
+
+    def get(self, scope: tuple[int, str, str]) -> Optional[StoredResponse]:
+        entry = self._entries.get(scope)
+        if entry is None:
+            return None
+        if entry.expires_at <= now_tashkent():
+            del self._entries[scope]
+            return None
+        self._entries.move_to_end(scope)
+        return entry
+
+    def put(self, scope: tuple[int, str, str], entry: StoredResponse):
+        self._entries[scope] = entry
+        self._entries.move_to_end(scope)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+idempotency_cache = IdempotencyCache(IDEMPOTENCY_CACHE_SIZE)
+
+
+def _replay(entry: StoredResponse, request_hash: str) -> JSONResponse:
+    if entry.request_hash != request_hash:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Idempotency-Key was already used with a different request body")
+    return JSONResponse(status_code=entry.status_code, content=entry.body, headers={"Idempotent-Replayed": "true"})
+
+
+async def _claim(db: AsyncSession, scope: tuple[int, str, str], request_hash: str) -> Optional[datetime.datetime]:
+    """
+    Insert an in-flight row for the key, taking over an expired one or one that has been in flight longer
+    than ``IDEMPOTENCY_LEASE_S`` (its request died before storing a response). Returns the claim's
+    ``created_at``, which identifies it from then on; None when the key is taken.
+    """
+    user_id, endpoint, key = scope
+    now = now_tashkent()
+    stmt = insert(IdempotencyKey).values(
+        key=key, user_id=user_id, endpoint=endpoint, request_hash=request_hash,
+        created_at=now, expires_at=now + datetime.timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint='idempotency_key_user_id_endpoint_key_key',
+        set_={
+            "request_hash": stmt.excluded.request_hash,
+            "status_code": None,
+            "response": None,
+            "created_at": stmt.excluded.created_at,
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=or_(IdempotencyKey.expires_at <= now,
+                  and_(IdempotencyKey.status_code.is_(None),
+                       IdempotencyKey.created_at <= now - datetime.timedelta(seconds=IDEMPOTENCY_LEASE_S))),
+    ).returning(IdempotencyKey.created_at)
+    claimed_at = (await db.execute(stmt)).scalar_one_or_none()
+    await db.commit()
+    return claimed_at
+
+
+class PendingResponse:
+    """Idempotent request running on a session, waiting for its write to stage the response"""
+
+    def __init__(self, scope: tuple[int, str, str], claimed_at: datetime.datetime, respond: Callable[[Any], BaseModel]):
+        self.scope = scope
+        self.claimed_at = claimed_at
+        self.respond = respond
+        self.response: Optional[BaseModel] = None
+        self.body: Optional[dict] = None
+        self.expires_at: Optional[datetime.datetime] = None
+
+
+async def stage_response(db: AsyncSession, result: Any):
+    """
+    Store the response of the idempotent request running on ``db``, if any, in the caller's transaction.
+
+    Writes call it right before their commit, so the change and its stored response commit together
+    and a retry can never apply the change a second time. Fails with a 409 (and the caller rolls
+    back) when a retry already took the key over after the lease ran out.
+    """
+    pending: Optional[PendingResponse] = db.info.get("idempotency")
+    if pending is None:
+        return
+    response = pending.respond(result)
+    body = jsonable_encoder(response)
+    user_id, endpoint, key = pending.scope
+    res = await db.execute(update(IdempotencyKey)
+                           .filter_by(user_id=user_id, endpoint=endpoint, key=key, created_at=pending.claimed_at,
+                                      status_code=None)
+                           .values(status_code=status.HTTP_200_OK, response=body)
+                           .returning(IdempotencyKey.expires_at)
+                           .execution_options(synchronize_session=False))
+    expires_at = res.scalar_one_or_none()
+    if expires_at is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="A retry with this Idempotency-Key took the request over")
+    pending.response, pending.body, pending.expires_at = response, body, expires_at
+
+
+async def idempotent(
+        db: AsyncSession,
+        current_user,
+        idempotency_key: Optional[str],
+        endpoint: str,
+        payload: BaseModel,
+        handler: Callable[[], Awaitable[Any]],
+        respond: Callable[[Any], BaseModel],
+):
+    """
+    Run ``handler`` at most once per ``(user, endpoint, Idempotency-Key)`` and return ``respond`` of its result.
+
+    The handler's write stores the response through ``stage_response`` in its own transaction; it is
+    kept for ``IDEMPOTENCY_TTL_HOURS`` and replayed as-is to retries with the same key and body,
+    without calling ``handler`` again. A retry that arrives while the first request is still running
+    gets a 409; a failed request releases its key, and a request that never finished (crashed
+    worker, nothing committed) loses it after ``IDEMPOTENCY_LEASE_S``.
+    """
+    if idempotency_key is None:
+        return respond(await handler())
+    if len(idempotency_key) > 255:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Idempotency-Key is too long")
+
+    scope = (current_user['id'], endpoint, idempotency_key)
+    request_hash = hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+    cached = idempotency_cache.get(scope)
+    if cached is not None:
+        return _replay(cached, request_hash)
+
+    try:
+        claimed_at = await _claim(db, scope, request_hash)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    if claimed_at is None:
+        res = await db.execute(select(IdempotencyKey.request_hash, IdempotencyKey.status_code,
+                                      IdempotencyKey.response, IdempotencyKey.expires_at)
+                               .filter_by(user_id=scope[0], endpoint=scope[1], key=scope[2]))
+        row = res.first()
+        if row is None or row.status_code is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="A request with this Idempotency-Key is still being processed")
+        entry = StoredResponse(row.request_hash, row.status_code, row.response, row.expires_at)
+        idempotency_cache.put(scope, entry)
+        return _replay(entry, request_hash)
+
+    pending = PendingResponse(scope, claimed_at, respond)
+    db.info["idempotency"] = pending
+    try:
+        result = await handler()
+    except Exception:
+        await _release(db, scope, claimed_at)
+        raise
+    finally:
+        db.info.pop("idempotency", None)
+
+    if pending.response is None:
+        print(f"❌ {endpoint} committed without staging its idempotent response")
+        return respond(result)
+    idempotency_cache.put(scope, StoredResponse(request_hash, status.HTTP_200_OK, pending.body, pending.expires_at))
+    return pending.response
+
+
+async def _release(db: AsyncSession, scope: tuple[int, str, str], claimed_at: datetime.datetime):
+    """Delete our in-flight row; one a retry took over, or one that already has a response, is left alone"""
+    try:
+        await db.rollback()
+        await db.execute(delete(IdempotencyKey).filter_by(user_id=scope[0], endpoint=scope[1], key=scope[2],
+                                                          created_at=claimed_at, status_code=None))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        print(f"❌ Failed to release Idempotency-Key: {e}")
+
+
+async def purge_expired_idempotency_keys(db: AsyncSession) -> int:
+    res = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now_tashkent()))
+    await db.commit()
+    return res.rowcount
@@ -0,0 +1,70 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import func, insert, literal, literal_column, true, TIMESTAMP
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import now_tashkent
+from app.models.inventory_ledger import InventoryLedger, InventorySnapshot, LedgerSource
+from app.models.meal_ingredient import Ingredient
+
+# Snapshots stop this far in the past so that ledger rows of still-open transactions are not skipped.
+SNAPSHOT_LAG = datetime.timedelta(minutes=5)
+
+
+async def record_stock_changes(db: AsyncSession, source: LedgerSource, changes: list[tuple[int, float, Optional[int]]]):
+    """Append ``(ingredient_id, delta, source_id)`` rows to the ledger in the caller's transaction"""
+    if not changes:
+        return
+    now = now_tashkent()
+    await db.execute(insert(InventoryLedger), [
+        {"ingredient_id": ingredient_id, "delta": delta, "source": source, "source_id": source_id, "created_at": now}
+        for ingredient_id, delta, source_id in changes
+    ])
+
+
+async def get_stock_at(db: AsyncSession, ingredient_id: int, at: datetime.datetime) -> float:
+    """Stock of an ingredient at ``at``: the last snapshot before it plus the ledger tail after the snapshot"""
+    res = await db.execute(select(InventorySnapshot.weight, InventorySnapshot.taken_at)
+                           .where(InventorySnapshot.ingredient_id == ingredient_id, InventorySnapshot.taken_at <= at)
+                           .order_by(InventorySnapshot.taken_at.desc())
+                           .limit(1))
+    snapshot = res.first()
+
+    tail = (select(func.coalesce(func.sum(InventoryLedger.delta), 0))
+            .where(InventoryLedger.ingredient_id == ingredient_id, InventoryLedger.created_at <= at))
+    if snapshot:
+        tail = tail.where(InventoryLedger.created_at > snapshot.taken_at)
+
+    return (snapshot.weight if snapshot else 0) + await db.scalar(tail)
+
+
+async def take_inventory_snapshot(db: AsyncSession, cutoff: Optional[datetime.datetime] = None) -> datetime.datetime:
+    """
+    Roll the latest snapshot of every ingredient with ledger rows since that snapshot forward to ``cutoff``.
+    Untouched ingredients get no row; their last snapshot plus the (empty) tail still gives the stock.
+    """
+    cutoff = cutoff or now_tashkent() - SNAPSHOT_LAG
+
+    latest = (select(InventorySnapshot.weight, InventorySnapshot.taken_at)
+              .where(InventorySnapshot.ingredient_id == Ingredient.id)
+              .order_by(InventorySnapshot.taken_at.desc())
+              .limit(1)
+              .lateral('latest'))
+    tail = (select(func.sum(InventoryLedger.delta).label('delta'))  # NULL when there are no rows
+            .where(InventoryLedger.ingredient_id == Ingredient.id,
+                   InventoryLedger.created_at > func.coalesce(latest.c.taken_at,
+                                                              literal_column("'-infinity'::timestamptz")),
+                   InventoryLedger.created_at <= cutoff)
+            .lateral('tail'))
+    rows = (select(Ingredient.id, func.coalesce(latest.c.weight, 0) + tail.c.delta,
+                   literal(cutoff, TIMESTAMP(timezone=True)))
+            .select_from(Ingredient)
+            .outerjoin(latest, true())
+            .join(tail, true())
+            .where(tail.c.delta.is_not(None)))
+
+    await db.execute(insert(InventorySnapshot).from_select(['ingredient_id', 'weight', 'taken_at'], rows))
+    await db.commit()
+    return cutoff
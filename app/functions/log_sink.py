@@ -0,0 +1,148 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional, Type
+
+from sqlalchemy import insert
+
+from app.auth.model import LoginInfo
+from app.config import LOG_SINK_BUFFER_SIZE, LOG_SINK_BATCH_SIZE, LOG_SINK_FLUSH_INTERVAL_MS
+from app.db.base import Base
+from app.db.db import async_session_maker, connection_lost
+from app.models.action_log import ActionLog
+
+
+class LogSink:
+    """
+    Write-behind buffer for append-only log rows.
+
+    Producers hand over plain column dicts and never touch the database: ``put_nowait`` drops the
+    row (and counts it) when the buffer is full, ``put`` waits for room instead. The writer task
+    inserts up to ``batch_size`` rows per multi-row INSERT in its own session, every
+    ``flush_interval_ms`` or as soon as a full batch is waiting. A batch that could not reach the
+    database goes back to the front of the buffer and is retried on the next interval; one the
+    database rejected is retried row by row, so only the offending row is lost (and counted as
+    rejected). ``flush`` writes what is left on shutdown.
+    """
+
+    def __init__(self, model: Type[Base], max_size: int, batch_size: int, flush_interval_ms: int):
+        self.model = model
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.buffer: deque[dict] = deque()
+        self.running = False
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self._batch_ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._writing: Optional[asyncio.Task] = None
+
+    def put_nowait(self, row: dict) -> bool:
+        if len(self.buffer) >= self.max_size:
+            self.dropped += 1
+            return False
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def put(self, row: dict) -> bool:
+        """Like ``put_nowait``, but waits for the writer to make room while it is running"""
+        while len(self.buffer) >= self.max_size and self.running:
+            self._space.clear()
+            await self._space.wait()
+        return self.put_nowait(row)
+
+    def _take(self) -> list[dict]:
+        batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+        if len(self.buffer) < self.batch_size:
+            self._batch_ready.clear()
+        self._space.set()
+        return batch
+
+    async def _insert(self, rows: list[dict]):
+        async with async_session_maker() as db:
+            await db.execute(insert(self.model), rows)
+            await db.commit()
+
+    def _requeue(self, rows: list[dict], error: Exception) -> bool:
+        self.failed_flushes += 1
+        room = self.max_size - len(self.buffer)
+        self.dropped += max(0, len(rows) - room)
+        self.buffer.extendleft(reversed(rows[:room]))
+        print(f"❌ Failed to write {len(rows)} {self.model.__tablename__} rows: {error}")
+        return False
+
+    async def _write(self, batch: list[dict]) -> bool:
+        start = time.perf_counter()
+        try:
+            await self._insert(batch)
+        except Exception as e:
+            if connection_lost(e):
+                return self._requeue(batch, e)
+            # One bad row fails the whole INSERT: write them one by one so only that row is lost
+            for i, row in enumerate(batch):
+                try:
+                    await self._insert([row])
+                except Exception as row_error:
+                    if connection_lost(row_error):
+                        return self._requeue(batch[i:], row_error)
+                    self.rejected += 1
+                    print(f"❌ Dropped a {self.model.__tablename__} row the database rejected: {row_error}")
+                else:
+                    self.written += 1
+            return True
+        self.written += len(batch)
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        return True
+
+    async def _drain(self):
+        while self.buffer:
+            self._writing = asyncio.create_task(self._write(self._take()))
+            # Shielded so cancelling the writer on shutdown does not lose the batch it already took.
+            written = await asyncio.shield(self._writing)
+            self._writing = None
+            if not written:
+                return
+
+    async def flush(self):
+        if self._writing is not None:
+            await self._writing
+            self._writing = None
+        while self.buffer:
+            if not await self._write(self._take()):
+                return
+
+    async def run(self):
+        self.running = True
+        try:
+            while True:
+                # asyncio.timeout rather than wait_for, which can swallow the shutdown cancellation
+                try:
+                    async with asyncio.timeout(self.flush_interval):
+                        await self._batch_ready.wait()
+                except TimeoutError:
+                    pass
+                await self._drain()
+        finally:
+            self.running = False
+            self._space.set()
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self.buffer),
+            "capacity": self.max_size,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+
+action_log_sink = LogSink(ActionLog, LOG_SINK_BUFFER_SIZE, LOG_SINK_BATCH_SIZE, LOG_SINK_FLUSH_INTERVAL_MS)
+login_info_sink = LogSink(LoginInfo, LOG_SINK_BUFFER_SIZE, LOG_SINK_BATCH_SIZE, LOG_SINK_FLUSH_INTERVAL_MS)
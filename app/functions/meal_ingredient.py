@@ -4,7 +4,7 @@ from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
-from app.endpoints.portion_estimation import broadcast_portion_updates
+from app.endpoints.portion_estimation import portion_worker
 from app.models.meal_ingredient import MealIngredient
 from app.schemas.meal_ingredient import MealIngredientCreate, MealIngredientUpdate
 
@@ -16,7 +16,7 @@ async def create_meal_ingredient(db: AsyncSession, meal_ingredient: MealIngredie
         await db.commit()
         await db.refresh(db_meal_ingredient)
 
-        await broadcast_portion_updates(db)
+        portion_worker.mark_dirty(meal_ids=[meal_ingredient.meal_id])
 
         return db_meal_ingredient
     except IntegrityError as e:
@@ -58,7 +58,7 @@ async def update_meal_ingredient(db: AsyncSession, meal_id: int, ingredient_id:
         await db.commit()
         await db.refresh(db_meal_ingredient)
 
-        await broadcast_portion_updates(db)
+        portion_worker.mark_dirty(meal_ids=[meal_id])
 
         return db_meal_ingredient
     except Exception as e:
@@ -71,6 +71,8 @@ async def delete_meal_ingredient(db: AsyncSession, meal_id: int, ingredient_id:
         db_meal_ingredient = await get_meal_ingredient(db, meal_id, ingredient_id)
         await db.delete(db_meal_ingredient)
         await db.commit()
+
+        portion_worker.mark_dirty(meal_ids=[meal_id])
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -1,54 +1,126 @@
+import base64
+import binascii
+import datetime
 from typing import Optional, List, Dict
 
-from sqlalchemy import select, func
+from sqlalchemy import select, tuple_, func, values, column, Integer
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.notification import Notification
+from app.models.notification import Notification, NotificationReadCursor
+
+
+def encode_cursor(n: Notification) -> str:
+    return base64.urlsafe_b64encode(f"{n.timestamp.isoformat()}|{n.id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """Position after which the next page starts; ValueError when the cursor is malformed"""
+    try:
+        timestamp, _, notification_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+        return datetime.datetime.fromisoformat(timestamp), int(notification_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
 
 
 async def get_notifications(
         db: AsyncSession,
         limit: int = 50,
-        page: int = 1,
+        cursor: Optional[str] = None,
         notification_type: Optional[str] = None
-) -> tuple[List[Dict], int]:
-    """Get notifications from database - for page load"""
+) -> tuple[List[Dict], Optional[str]]:
+    """
+    Keyset page of notifications, newest first - for page load.
 
-    # Build query with optional filters
+    ``cursor`` is the ``next_cursor`` of the previous page; it is ``None`` on the last page. Rows are
+    ordered by ``(timestamp, id)`` so every page is one range scan of the timestamp index.
+    """
     query = select(Notification)
     if notification_type:
         query = query.where(Notification.type == notification_type)
+    if cursor:
+        timestamp, notification_id = decode_cursor(cursor)
+        query = query.where(tuple_(Notification.timestamp, Notification.id) < tuple_(timestamp, notification_id))
 
-    # Get total count
-    count_query = select(func.count(Notification.id))
-    if notification_type:
-        count_query = count_query.where(Notification.type == notification_type)
+    # One extra row tells whether there is a next page
+    query = query.order_by(Notification.timestamp.desc(), Notification.id.desc()).limit(limit + 1)
+    result = await db.execute(query)
+    notifications = result.scalars().all()
 
-    total_count = await db.scalar(count_query)
+    next_cursor = encode_cursor(notifications[limit - 1]) if len(notifications) > limit else None
+    return [notification_to_dict(n) for n in notifications[:limit]], next_cursor
 
-    # Get paginated results
-    query = (query.order_by(Notification.timestamp.desc())
-             .limit(limit)
-             .offset((page - 1) * limit))
 
-    result = await db.execute(query)
-    notifications = result.scalars().all()
+async def get_notifications_after(
+        db: AsyncSession,
+        after_id: int,
+        types: Optional[List[str]] = None,
+        meal_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        limit: int = 100
+) -> List[Dict]:
+    """Keyset page of notifications with ``id > after_id``, oldest first - for websocket replay"""
+    query = select(Notification).where(Notification.id > after_id)
+    if types:
+        query = query.where(Notification.type.in_(types))
+    if meal_id is not None:
+        query = query.where(Notification.meal_id == meal_id)
+    if user_id is not None:
+        query = query.where(Notification.user_id == user_id)
+
+    result = await db.execute(query.order_by(Notification.id).limit(limit))
+    return [notification_to_dict(n) for n in result.scalars().all()]
+
+
+async def get_last_read_id(db: AsyncSession, user_id: int) -> int:
+    last_read_id = await db.scalar(select(NotificationReadCursor.last_read_id)
+                                   .where(NotificationReadCursor.user_id == user_id))
+    return last_read_id or 0
+
+
+async def set_last_read_id(db: AsyncSession, user_id: int, last_read_id: int) -> int:
+    """Move the user's read cursor forward (never back); returns the stored position"""
+    stmt = insert(NotificationReadCursor).values(user_id=user_id, last_read_id=last_read_id)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[NotificationReadCursor.user_id],
+        set_={
+            "last_read_id": func.greatest(NotificationReadCursor.last_read_id, stmt.excluded.last_read_id),
+            "updated_at": func.now(),
+        },
+    ).returning(NotificationReadCursor.last_read_id)
+    stored = (await db.execute(stmt)).scalar_one()
+    await db.commit()
+    return stored
+
+
+async def count_unread(db: AsyncSession, last_read_id: int) -> int:
+    return await db.scalar(select(func.count(Notification.id)).where(Notification.id > last_read_id))
+
+
+async def get_unread_counts(db: AsyncSession, user_ids: List[int]) -> Dict[int, tuple[int, int]]:
+    """``{user_id: (last_read_id, unread_count)}`` for many users in one query"""
+    users = values(column('user_id', Integer), name='users').data([(user_id,) for user_id in user_ids])
+    last_read_id = func.coalesce(NotificationReadCursor.last_read_id, 0)
+    unread = select(func.count(Notification.id)).where(Notification.id > last_read_id).scalar_subquery()
+    result = await db.execute(
+        select(users.c.user_id, last_read_id, unread)
+        .select_from(users.outerjoin(NotificationReadCursor, NotificationReadCursor.user_id == users.c.user_id))
+    )
+    return {user_id: (last_read, count) for user_id, last_read, count in result.all()}
+
 
-    # Convert to dict format
-    notifications_data = [
-        {
-            "id": n.id,
-            "type": n.type,
-            "message": n.message,
-            "month": n.month,
-            "year": n.year,
-            "difference_rate": n.difference_rate,
-            "threshold": n.threshold,
-            "meal_id": n.meal_id,
-            "user_id": n.user_id,
-            "timestamp": n.timestamp
-        }
-        for n in notifications
-    ]
-
-    return notifications_data, total_count
+def notification_to_dict(n: Notification) -> Dict:
+    return {
+        "id": n.id,
+        "type": n.type,
+        "message": n.message,
+        "month": n.month,
+        "year": n.year,
+        "difference_rate": n.difference_rate,
+        "threshold": n.threshold,
+        "meal_id": n.meal_id,
+        "user_id": n.user_id,
+        "timestamp": n.timestamp.isoformat() if n.timestamp else None,
+        "occurrence_count": n.occurrence_count,
+        "last_seen": n.last_seen.isoformat() if n.last_seen else None
+    }
@@ -0,0 +1,20 @@
+import numpy as np
+
+
+def max_portions(weights: np.ndarray, stock: np.ndarray) -> np.ndarray:
+    """
+    Portions of every meal that ``stock`` can cover, computed for all meals at once.
+
+    ``weights`` is a meals x ingredients matrix of grams per portion, ``stock`` the grams available
+    per ingredient column. A zero weight means the meal does not use that ingredient; a meal that
+    uses nothing gets 0 portions, like the old per-row loop.
+    """
+    if weights.shape[1] == 0:
+        return np.zeros(weights.shape[0], dtype=np.int64)
+
+    per_ingredient = np.full(weights.shape, np.inf)
+    np.floor_divide(stock, weights, out=per_ingredient, where=weights > 0)
+
+    counts = per_ingredient.min(axis=1)
+    counts[np.isinf(counts)] = 0
+    return counts.astype(np.int64)
@@ -1,51 +1,93 @@
+from typing import Iterable, Optional
+
+import numpy as np
 from sqlalchemy import func, delete
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from app.models.meal_ingredient import Meal, Ingredient, MealIngredient
+from app.config import now_tashkent
+from app.functions.portion_engine import max_portions
+from app.functions.recipe_graph import recipe_graph
+from app.models.meal_ingredient import Ingredient
 from app.models.portion_estimation import PortionEstimation
 
 
-async def estimate_portions(db: AsyncSession) -> list[dict]:
-    await db.execute(delete(PortionEstimation))
+async def estimate_portions(
+        db: AsyncSession,
+        ingredient_ids: Optional[Iterable[int]] = None,
+        meal_ids: Optional[Iterable[int]] = None,
+) -> tuple[list[dict], list[int]]:
+    """
+    Recompute portion estimations for the meals touched by a write and store the ones that changed.
+
+    Affected meals are found through the recipe graph's ingredient -> meals index and their counts
+    come from one vectorized pass over their rows of the dense recipe matrix; without any ids every
+    meal is recomputed. Returns the rows whose portion_count (or name) changed and the ids of
+    meals that no longer have any ingredients and whose rows were removed.
+    """
+    await recipe_graph.ensure_loaded(db)
+
+    existing_stmt = select(PortionEstimation.meal_id, PortionEstimation.meal_name, PortionEstimation.portion_count)
+    if ingredient_ids is None and meal_ids is None:
+        affected = set(recipe_graph.meals_with_recipes())
+    else:
+        affected = set(meal_ids or ()) | recipe_graph.meals_using(ingredient_ids or ())
+        if not affected:
+            return [], []
+        existing_stmt = existing_stmt.where(PortionEstimation.meal_id.in_(affected))
+
+    meal_ids = sorted(meal_id for meal_id in affected if recipe_graph.meal_row(meal_id) is not None)
+    weights = recipe_graph.dense()[[recipe_graph.meal_row(meal_id) for meal_id in meal_ids]]
+    columns = np.flatnonzero((weights > 0).any(axis=0))
+    ingredient_ids = np.asarray(recipe_graph.ingredients_in_recipes(), dtype=np.int64)[columns]
+
+    stock = np.zeros(weights.shape[1])
+    if len(columns):
+        result = await db.execute(select(Ingredient.id, Ingredient.weight)
+                                  .where(Ingredient.id.in_(ingredient_ids.tolist())))
+        weight_by_id = dict(result.all())
+        stock[columns] = [weight_by_id.get(ingredient_id, 0) for ingredient_id in ingredient_ids.tolist()]
+
+    portion_counts = max_portions(weights, stock)
+    meal_map = {
+        meal_id: {
+            "meal_id": meal_id,
+            "meal_name": recipe_graph.meal_names.get(meal_id, ""),
+            "portion_count": int(portion_count)
+        }
+        for meal_id, portion_count in zip(meal_ids, portion_counts)
+    }
 
-    stmt = (select(Meal.id, Meal.name, MealIngredient, Ingredient)
-            .join(MealIngredient, Meal.id == MealIngredient.meal_id)
-            .join(Ingredient, MealIngredient.ingredient_id == Ingredient.id))
-    result = await db.execute(stmt)
-    rows = result.all()
+    result = await db.execute(existing_stmt)
+    existing = {p.meal_id: p for p in result.all()}
 
-    meal_map = {}
-    for meal_id, meal_name, mi, ing in rows:
-        meal_map.setdefault(meal_id, {
-            "meal_id": meal_id,
-            "meal_name": meal_name,
-            "portion_count": float('inf')
-        })
-
-        if mi.weight == 0:
-            continue
-        possible = ing.weight // mi.weight
-        meal_map[meal_id]["portion_count"] = min(meal_map[meal_id]["portion_count"], possible)
-
-    for meal in meal_map.values():
-        if meal["portion_count"] == float('inf'):
-            meal["portion_count"] = 0
-        # Ensure portion_count is an integer
-        meal["portion_count"] = int(meal["portion_count"])
-
-    for meal_data in meal_map.values():
-        new_record = PortionEstimation(
-            meal_id=meal_data["meal_id"],
-            meal_name=meal_data["meal_name"],
-            portion_count=meal_data["portion_count"]
+    changed = [
+        meal for _, meal in sorted(meal_map.items())
+        if meal["meal_id"] not in existing
+        or existing[meal["meal_id"]].portion_count != meal["portion_count"]
+        or existing[meal["meal_id"]].meal_name != meal["meal_name"]
+    ]
+    removed = [meal_id for meal_id in existing if meal_id not in meal_map]
+
+    if changed:
+        now = now_tashkent()
+        upsert = insert(PortionEstimation).values([{**meal, "created_at": now, "updated_at": now} for meal in changed])
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[PortionEstimation.meal_id],
+            set_={
+                "meal_name": upsert.excluded.meal_name,
+                "portion_count": upsert.excluded.portion_count,
+                "updated_at": upsert.excluded.updated_at,
+            }
         )
-        db.add(new_record)
+        await db.execute(upsert)
+    if removed:
+        await db.execute(delete(PortionEstimation).where(PortionEstimation.meal_id.in_(removed)))
 
     await db.commit()
 
-
-    return list(meal_map.values())
+    return changed, removed
 
 
 async def get_portion_estimation(db: AsyncSession, limit: int = 20, page: int = 1):
@@ -0,0 +1,223 @@
+import asyncio
+import time
+from array import array
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.event import listens_for
+from sqlalchemy.future import select
+from sqlalchemy.orm.session import Session
+
+from app.config import RECIPE_VERSION_CHECK_INTERVAL_S
+from app.functions.broadcast_bus import broadcast_bus, invalidations_reach_all_workers, NODE_ID
+from app.models.meal_ingredient import Meal, Ingredient, MealIngredient, RecipeVersion
+
+
+class RecipeGraph:
+    """
+    In-process copy of the recipe data: meal -> [(ingredient_id, weight)] and ingredient -> [meal_id].
+
+    Both directions are stored CSR-style in flat arrays: the recipe of the meal in slot ``i`` is
+    ``_ingredient_ids[_meal_offsets[i]:_meal_offsets[i + 1]]`` with the matching ``_weights``, and the
+    meals using the ingredient in slot ``j`` are ``_meal_ids[_ingredient_offsets[j]:_ingredient_offsets[j + 1]]``.
+    The graph is rebuilt from the database after a commit that touched meals, recipes or deleted
+    ingredients, in this process or, through the broadcast bus, in another API worker
+    (see ``register_recipe_graph_listeners``). Such commits also bump ``recipe_version``; when the bus
+    does not reach every worker, ``ensure_loaded`` compares it with the version the graph was built
+    from at most once per ``RECIPE_VERSION_CHECK_INTERVAL_S``, so a missed change costs a reload
+    instead of a stale recipe. ``dense()`` expands it into a
+    meals x ingredients weight matrix for the vectorized portion engine.
+    """
+
+    def __init__(self):
+        self.meal_names: dict[int, str] = {}
+        self._meal_slot: dict[int, int] = {}
+        self._meal_offsets = array('q', [0])
+        self._ingredient_ids = array('q')
+        self._weights = array('d')
+        self._ingredient_slot: dict[int, int] = {}
+        self._ingredient_offsets = array('q', [0])
+        self._meal_ids = array('q')
+        self._dense = None
+
+        self._version = 0
+        self._loaded_version = -1
+        self.db_version = None
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_version == self._version
+
+    def invalidate(self):
+        self._version += 1
+
+    async def ensure_loaded(self, db: AsyncSession):
+        # A shared bus delivers every change, and a reconnect invalidates anyway
+        if self.loaded and not invalidations_reach_all_workers():
+            now = time.monotonic()
+            if now - self._checked_at >= RECIPE_VERSION_CHECK_INTERVAL_S:
+                self._checked_at = now
+                if await current_recipe_version(db) != self.db_version:
+                    self.invalidate()
+        if self.loaded:
+            return
+        async with self._lock:
+            if not self.loaded:
+                await self.load(db)
+
+    async def load(self, db: AsyncSession):
+        version = self._version
+        db_version = await current_recipe_version(db)  # Read first: a recipe committed meanwhile just means another reload
+
+        res = await db.execute(select(Meal.id, Meal.name))
+        meal_names = {meal_id: name for meal_id, name in res.all()}
+
+        res = await db.execute(select(MealIngredient.meal_id, MealIngredient.ingredient_id, MealIngredient.weight)
+                               .order_by(MealIngredient.meal_id, MealIngredient.ingredient_id))
+        rows = res.all()
+
+        meal_slot: dict[int, int] = {}
+        meal_offsets = array('q', [0])
+        ingredient_ids = array('q')
+        weights = array('d')
+        usage: dict[int, list[int]] = {}
+        for meal_id, ingredient_id, weight in rows:
+            if meal_id not in meal_slot:
+                if meal_slot:
+                    meal_offsets.append(len(ingredient_ids))
+                meal_slot[meal_id] = len(meal_slot)
+            ingredient_ids.append(ingredient_id)
+            weights.append(weight)
+            usage.setdefault(ingredient_id, []).append(meal_id)
+        if meal_slot:
+            meal_offsets.append(len(ingredient_ids))
+
+        ingredient_slot: dict[int, int] = {}
+        ingredient_offsets = array('q', [0])
+        meal_ids = array('q')
+        for ingredient_id, meals in usage.items():
+            ingredient_slot[ingredient_id] = len(ingredient_slot)
+            meal_ids.extend(meals)
+            ingredient_offsets.append(len(meal_ids))
+
+        # Swap everything in at once, no awaits below this point.
+        self.meal_names = meal_names
+        self._meal_slot = meal_slot
+        self._meal_offsets = meal_offsets
+        self._ingredient_ids = ingredient_ids
+        self._weights = weights
+        self._ingredient_slot = ingredient_slot
+        self._ingredient_offsets = ingredient_offsets
+        self._meal_ids = meal_ids
+        self._dense = None
+        self.db_version = db_version
+        self._checked_at = time.monotonic()
+        self._loaded_version = version
+
+    def recipe(self, meal_id: int) -> list[tuple[int, float]]:
+        slot = self._meal_slot.get(meal_id)
+        if slot is None:
+            return []
+        start, end = self._meal_offsets[slot], self._meal_offsets[slot + 1]
+        return list(zip(self._ingredient_ids[start:end], self._weights[start:end]))
+
+    def meals_using(self, ingredient_ids: Iterable[int]) -> set[int]:
+        meals = set()
+        for ingredient_id in ingredient_ids:
+            slot = self._ingredient_slot.get(ingredient_id)
+            if slot is not None:
+                meals.update(self._meal_ids[self._ingredient_offsets[slot]:self._ingredient_offsets[slot + 1]])
+        return meals
+
+    def meals_with_recipes(self) -> list[int]:
+        return list(self._meal_slot)
+
+    def ingredients_in_recipes(self) -> list[int]:
+        return list(self._ingredient_slot)
+
+    def meal_row(self, meal_id: int) -> int | None:
+        return self._meal_slot.get(meal_id)
+
+    def ingredient_column(self, ingredient_id: int) -> int | None:
+        return self._ingredient_slot.get(ingredient_id)
+
+    def dense(self) -> np.ndarray:
+        """
+        Weight matrix with one row per ``meals_with_recipes()`` entry and one column per
+        ``ingredients_in_recipes()`` entry, in the same order; 0 where a meal does not use an ingredient.
+        """
+        if self._dense is None:
+            matrix = np.zeros((len(self._meal_slot), len(self._ingredient_slot)))
+            rows = np.repeat(np.arange(len(self._meal_slot)), np.diff(np.asarray(self._meal_offsets)))
+            columns = np.fromiter((self._ingredient_slot[i] for i in self._ingredient_ids), dtype=np.int64,
+                                  count=len(self._ingredient_ids))
+            matrix[rows, columns] = np.asarray(self._weights)
+            self._dense = matrix
+        return self._dense
+
+
+recipe_graph = RecipeGraph()
+
+
+async def current_recipe_version(db: AsyncSession) -> int:
+    return await db.scalar(select(RecipeVersion.version).filter_by(id=1)) or 0
+
+
+bump_recipe_version = (insert(RecipeVersion).values(id=1, version=1)
+                       .on_conflict_do_update(index_elements=[RecipeVersion.id],
+                                              set_={"version": RecipeVersion.version + 1}))
+
+
+def _touches_recipes(session) -> bool:
+    for instance in session.new:
+        if isinstance(instance, (Meal, MealIngredient)):
+            return True
+    for instance in session.dirty:
+        if isinstance(instance, (Meal, MealIngredient)) and session.is_modified(instance):
+            return True
+    for instance in session.deleted:
+        if isinstance(instance, (Meal, MealIngredient, Ingredient)):
+            return True
+    return False
+
+
+def _on_remote_invalidation(data):
+    if data.get("origin") != NODE_ID:
+        recipe_graph.invalidate()
+
+
+async def _resync_recipe_graph():
+    recipe_graph.invalidate()  # Reloaded on next use
+
+
+def register_recipe_graph_listeners():
+    broadcast_bus.subscribe("recipe_graph", _on_remote_invalidation)
+    broadcast_bus.on_reconnect(_resync_recipe_graph)
+
+    @listens_for(Session, 'before_flush')
+    def mark_recipe_changes(session, flush_context, instances):
+        if _touches_recipes(session):
+            session.info['recipe_graph_dirty'] = True
+
+    @listens_for(Session, 'after_flush')
+    def bump_version(session, flush_context):
+        # Once per transaction, in the same transaction, so readers never see the new recipe with the old version
+        if session.info.get('recipe_graph_dirty') and not session.info.get('recipe_version_bumped'):
+            session.connection().execute(bump_recipe_version)
+            session.info['recipe_version_bumped'] = True
+
+    @listens_for(Session, 'after_commit')
+    def invalidate_recipe_graph(session):
+        session.info.pop('recipe_version_bumped', None)
+        if session.info.pop('recipe_graph_dirty', False):
+            recipe_graph.invalidate()
+            broadcast_bus.publish("recipe_graph", {"origin": NODE_ID})
+
+    @listens_for(Session, 'after_rollback')
+    def discard_recipe_changes(session):
+        session.info.pop('recipe_graph_dirty', None)
+        session.info.pop('recipe_version_bumped', None)
@@ -1,36 +1,92 @@
-from datetime import datetime, date
+from datetime import date
 from typing import Optional
 
-from sqlalchemy import func
+from sqlalchemy import func, insert, update, values, column, Integer, Float
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
+from app.config import now_tashkent
 from app.endpoints.notification import broadcast_alert
-from app.endpoints.portion_estimation import broadcast_portion_updates
-from app.models.meal_ingredient import MealIngredient, Ingredient
+from app.endpoints.portion_estimation import portion_worker
+from app.functions.idempotency import stage_response
+from app.functions.inventory_ledger import record_stock_changes
+from app.functions.recipe_graph import recipe_graph
+from app.models.inventory_ledger import LedgerSource
+from app.models.meal_ingredient import Ingredient
 from app.models.serve_meal import MealServing
-from app.schemas.serve_meal import ServeMealCreate, ServeMealRead, ServeMealListResponse
+from app.schemas.serve_meal import ServeMealCreate, ServeMealBatchCreate, ServeMealRead, ServeMealListResponse
+
+
+async def decrement_stock(db: AsyncSession, needs: dict[int, float]) -> list[dict]:
+    """Take ``needs`` (ingredient id -> grams) off the stock of each ingredient.
+
+    The ingredient rows are locked in id order so concurrent serves queue up instead of
+    deadlocking, and all of them are decremented with a single conditional UPDATE.
+    Returns the shortages; when there are any nothing is written.
+    """
+    if not needs:
+        return []
+
+    lock_stmt = (select(Ingredient.id, Ingredient.name, Ingredient.weight)
+                 .where(Ingredient.id.in_(needs.keys()))
+                 .order_by(Ingredient.id)
+                 .with_for_update())
+    res = await db.execute(lock_stmt)
+    stock = {row.id: row for row in res.all()}
+
+    shortages = [
+        {
+            "ingredient_id": ingredient_id,
+            # An ingredient deleted since the recipe graph loaded has no row left to name it.
+            "name": stock[ingredient_id].name if ingredient_id in stock else f"ingredient {ingredient_id}",
+            "required": weight,
+            "available": stock[ingredient_id].weight if ingredient_id in stock else 0,
+        }
+        for ingredient_id, weight in sorted(needs.items())
+        if ingredient_id not in stock or stock[ingredient_id].weight < weight
+    ]
+    if shortages:
+        return shortages
+
+    needed = (values(column("ingredient_id", Integer), column("weight", Float), name="needed")
+              .data(sorted(needs.items())))
+    stmt = (update(Ingredient)
+            .where(Ingredient.id == needed.c.ingredient_id, Ingredient.weight >= needed.c.weight)
+            .values(weight=Ingredient.weight - needed.c.weight)
+            .returning(Ingredient.id)
+            .execution_options(synchronize_session=False))
+    res = await db.execute(stmt)
+    updated = res.scalars().all()
+    if len(updated) != len(needs):
+        raise RuntimeError(f"Stock changed while locked: updated {len(updated)} of {len(needs)} ingredients")
+
+    return []
 
 
 async def create_serve_meal(db: AsyncSession, current_user, serve_meal: ServeMealCreate) -> MealServing:
-    stmt = (select(MealIngredient, Ingredient)
-            .join(Ingredient, MealIngredient.ingredient_id == Ingredient.id)
-            .where(MealIngredient.meal_id == serve_meal.meal_id))
+    await recipe_graph.ensure_loaded(db)
+    needs = dict(recipe_graph.recipe(serve_meal.meal_id))
 
-    res = await db.execute(stmt)
-    rows = res.all()
-    insufficient = [ing.name for mi, ing in rows if ing.weight < mi.weight]
-    if insufficient:
+    try:
+        shortages = await decrement_stock(db, needs)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    if shortages:
+        # Release the row locks before the alert commits on this session.
+        await db.rollback()
+        insufficient = [shortage["name"] for shortage in shortages]
 
         await broadcast_alert({
             "type": "insufficient_stock",
             "meal_id": serve_meal.meal_id,
             "user_id": current_user["id"],
             "message": f"Cannot serve meal {serve_meal.meal_id}: insufficient inventory for {', '.join(insufficient)}",
-            "timestamp": datetime.now().isoformat()
-        }, db)
+            "timestamp": now_tashkent()
+        })
 
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -38,22 +94,102 @@ async def create_serve_meal(db: AsyncSession, current_user, serve_meal: ServeMea
         )
 
     try:
-        for mi, ing in rows:
-            ing.weight -= mi.weight
-            db.add(ing)
-
         serving = MealServing(
             meal_id=serve_meal.meal_id,
             served_by=current_user['id']
         )
 
         db.add(serving)
-        await db.commit()
+        await db.flush()
+        await record_stock_changes(db, LedgerSource.SERVING,
+                                   [(ingredient_id, -weight, serving.id) for ingredient_id, weight in needs.items()])
         await db.refresh(serving)
+        await stage_response(db, serving)
+        await db.commit()
 
-        await broadcast_portion_updates(db)
+        portion_worker.mark_dirty(ingredient_ids=needs.keys())
 
         return serving
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+async def create_serve_meal_batch(db: AsyncSession, current_user, batch: ServeMealBatchCreate) -> list[MealServing]:
+    quantities: dict[int, int] = {}
+    for item in batch.items:
+        quantities[item.meal_id] = quantities.get(item.meal_id, 0) + item.quantity
+
+    await recipe_graph.ensure_loaded(db)
+    recipes = {meal_id: recipe_graph.recipe(meal_id) for meal_id in quantities}
+    needs: dict[int, float] = {}
+    for meal_id, recipe in recipes.items():
+        for ingredient_id, weight in recipe:
+            needs[ingredient_id] = needs.get(ingredient_id, 0) + weight * quantities[meal_id]
+
+    try:
+        shortages = await decrement_stock(db, needs)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    if shortages:
+        await db.rollback()
+        short = {shortage["ingredient_id"]: shortage for shortage in shortages}
+        report = []
+        for meal_id, quantity in quantities.items():
+            meal_shortages = [
+                {**short[ingredient_id], "needed_by_meal": weight * quantity}
+                for ingredient_id, weight in recipes[meal_id]
+                if ingredient_id in short
+            ]
+            if meal_shortages:
+                report.append({"meal_id": meal_id, "quantity": quantity, "shortages": meal_shortages})
+
+        for meal_report in report:
+            insufficient = [shortage["name"] for shortage in meal_report["shortages"]]
+            await broadcast_alert({
+                "type": "insufficient_stock",
+                "meal_id": meal_report["meal_id"],
+                "user_id": current_user["id"],
+                "message": f"Cannot serve {meal_report['quantity']} x meal {meal_report['meal_id']}: "
+                           f"insufficient inventory for {', '.join(insufficient)}",
+                "timestamp": now_tashkent()
+            })
+
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"message": "Not enough inventory to serve the batch", "meals": report}
+        )
+
+    try:
+        rows = [
+            {"meal_id": meal_id, "served_by": current_user['id']}
+            for meal_id, quantity in quantities.items()
+            for _ in range(quantity)
+        ]
+        res = await db.execute(insert(MealServing).returning(MealServing.id, sort_by_parameter_order=True), rows)
+        serving_ids = res.scalars().all()
+        # RETURNING is sorted by parameter order, so ids line up with ``rows``.
+        changes = []
+        for serving_id, row in zip(serving_ids, rows):
+            changes.extend((ingredient_id, -weight, serving_id) for ingredient_id, weight in recipes[row["meal_id"]])
+        await record_stock_changes(db, LedgerSource.SERVING, changes)
+
+        res = await db.execute(select(MealServing).where(MealServing.id.in_(serving_ids)).order_by(MealServing.id))
+        servings = res.scalars().all()
+        await stage_response(db, servings)
+        await db.commit()
+
+        portion_worker.mark_dirty(ingredient_ids=needs.keys())
+
+        return servings
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
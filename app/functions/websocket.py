@@ -0,0 +1,366 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+import jwt
+import msgpack
+import orjson
+from fastapi import WebSocket
+from jwt import PyJWTError
+
+from app.config import SECRET, ALGORITHM, WS_SEND_QUEUE_SIZE, WS_SLOW_CONSUMER_POLICY, WS_HEARTBEAT_INTERVAL_S, \
+    WS_IDLE_TIMEOUT_S, WS_MAX_CONNECTIONS, WS_MAX_CONNECTIONS_PER_USER
+from app.functions.broadcast_bus import broadcast_bus
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+# Close code for a client that cannot keep up, or that is over a connection cap (RFC 6455 "Try Again Later").
+SLOW_CONSUMER_CLOSE_CODE = 1013
+OVER_CAPACITY_CLOSE_CODE = 1013
+# Close code for a client that stopped answering heartbeats (RFC 6455 "Going Away").
+IDLE_CLOSE_CODE = 1001
+
+PING = {"type": "ping"}
+
+# Clients that offer this subprotocol get binary msgpack frames instead of JSON text frames.
+MSGPACK_SUBPROTOCOL = "msgpack"
+JSON = "json"
+
+
+def encode(data: Any, encoding: str) -> tuple[str | bytes, int]:
+    """Wire frame for ``data`` and its size in bytes"""
+    if encoding == MSGPACK_SUBPROTOCOL:
+        frame = msgpack.packb(data, default=str)
+        return frame, len(frame)
+    frame = orjson.dumps(data, default=str)
+    return frame.decode(), len(frame)
+
+
+def decode(message: dict) -> Any:
+    """Payload of a ``websocket.receive`` message in either wire format; None when it is not valid"""
+    try:
+        if message.get("bytes") is not None:
+            return msgpack.unpackb(message["bytes"])
+        if message.get("text") is not None:
+            return orjson.loads(message["text"])
+    except ValueError:  # Both libraries' decode errors subclass it
+        pass
+    return None
+
+
+def connection_owner(websocket: WebSocket) -> str:
+    """User a socket counts against for the per-user cap: the JWT user if one is sent, else the client address"""
+    token = websocket.query_params.get("token")
+    authorization = websocket.headers.get("authorization")
+    if not token and authorization and authorization.startswith("Bearer "):
+        token = authorization[7:]
+    if token:
+        try:
+            payload = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
+            if payload.get("user_id") is not None:
+                return f"user:{payload['user_id']}"
+        except PyJWTError:
+            pass
+    return f"host:{websocket.client.host}" if websocket.client else "host:unknown"
+
+
+class ConnectionLimiter:
+    """Global and per-user caps on open websockets, shared by every broadcaster of the process"""
+
+    def __init__(self, max_connections: int, max_per_user: int):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.total = 0
+        self.per_owner: dict[str, int] = {}
+        self.rejected = 0
+
+    def acquire(self, owner: str) -> bool:
+        if self.total >= self.max_connections or self.per_owner.get(owner, 0) >= self.max_per_user:
+            self.rejected += 1
+            return False
+        self.total += 1
+        self.per_owner[owner] = self.per_owner.get(owner, 0) + 1
+        return True
+
+    def release(self, owner: str):
+        self.total -= 1
+        count = self.per_owner.get(owner, 0) - 1
+        if count > 0:
+            self.per_owner[owner] = count
+        else:
+            self.per_owner.pop(owner, None)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.total,
+            "max_connections": self.max_connections,
+            "max_connections_per_user": self.max_per_user,
+            "owners": len(self.per_owner),
+            "rejected": self.rejected,
+        }
+
+
+connection_limiter = ConnectionLimiter(WS_MAX_CONNECTIONS, WS_MAX_CONNECTIONS_PER_USER)
+
+
+class Subscriber:
+    """One websocket with its own bounded send queue, drained by a dedicated writer task"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int, encoding: str = JSON,
+                 match: Optional[Callable[[Any], bool]] = None, owner: str = ""):
+        self.websocket = websocket
+        self.owner = owner
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        self.queue_size = queue_size
+        self.encoding = encoding
+        self.match = match
+        self.queue: deque = deque()
+        self.ready = asyncio.Event()
+        self.drained = asyncio.Event()
+        # While paused, live messages wait here (bounded) until ``resume``.
+        self.paused = False
+        self.pending: deque = deque(maxlen=queue_size)
+        self.sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.writer: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def stats(self) -> dict:
+        return {
+            "client": f"{self.websocket.client.host}:{self.websocket.client.port}" if self.websocket.client else None,
+            "owner": self.owner,
+            "connected_s": round(time.monotonic() - self.connected_at, 1),
+            "idle_s": round(time.monotonic() - self.last_seen, 1),
+            "encoding": self.encoding,
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+        }
+
+
+class WebSocketBroadcaster:
+    """
+    Fan-out to a set of websockets that never waits on a client.
+
+    ``broadcast`` publishes on the broadcast bus under the broadcaster's name, so with a shared
+    backend every process delivers the message to its own sockets. ``deliver`` encodes the payload
+    once per wire format (JSON text, or msgpack for clients that negotiated the ``msgpack``
+    subprotocol) and only appends the shared frame to each subscriber's queue; every subscriber has
+    a writer task that sends in order. When a queue is full the slow consumer either loses its
+    oldest message (``drop_oldest``) or is disconnected (``disconnect``). Sockets whose send fails
+    are pruned.
+
+    ``listen`` owns the rest of a socket's life: it pings the client every
+    ``WS_HEARTBEAT_INTERVAL_S`` and closes it once nothing (a pong or any other message) has come
+    back for ``WS_IDLE_TIMEOUT_S``. New sockets are refused once ``connection_limiter`` is full.
+    """
+
+    def __init__(self, name: str, queue_size: int = WS_SEND_QUEUE_SIZE, policy: str = WS_SLOW_CONSUMER_POLICY):
+        if policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.name = name
+        self.queue_size = queue_size
+        self.policy = policy
+        self.subscribers: dict[WebSocket, Subscriber] = {}
+        self.dropped = 0
+        self.evicted = 0
+        self.idle_closed = 0
+        self.bytes_sent = 0
+        self.observers: list[Callable[[Any], None]] = []  # Called with every message this process delivers
+        self._close_tasks: set[asyncio.Task] = set()  # Evicted sockets still closing; keeps the tasks alive
+        broadcast_bus.subscribe(name, self.deliver)
+
+    async def connect(
+            self,
+            websocket: WebSocket,
+            backlog: Optional[Callable[[], list]] = None,
+            match: Optional[Callable[[Any], bool]] = None,
+            paused: bool = False,
+    ) -> Optional[Subscriber]:
+        """
+        Accept and register a websocket, or refuse it and return None when a connection cap is hit.
+
+        ``backlog`` is called once the socket is registered, with no await in between, and its
+        messages are queued ahead of any live message. Only live messages for which ``match`` is
+        true are delivered; a ``paused`` socket holds them back until ``resume``, so a backlog that
+        has to be read from the database can be sent first.
+        """
+        owner = connection_owner(websocket)
+        if not connection_limiter.acquire(owner):
+            await self._close(websocket, OVER_CAPACITY_CLOSE_CODE)
+            return None
+        encoding = MSGPACK_SUBPROTOCOL if MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", []) else JSON
+        try:
+            await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL if encoding == MSGPACK_SUBPROTOCOL else None)
+        except Exception:
+            connection_limiter.release(owner)
+            raise
+        subscriber = Subscriber(websocket, self.queue_size, encoding, match, owner)
+        subscriber.paused = paused
+        subscriber.writer = asyncio.create_task(self._write(subscriber))
+        self.subscribers[websocket] = subscriber
+        if backlog is not None:
+            subscriber.queue.extend(encode(message, encoding) for message in backlog())
+            subscriber.ready.set()
+        return subscriber
+
+    async def send_backlog(self, subscriber: Subscriber, messages: list):
+        """Queue ``messages`` for a socket regardless of its queue limit and wait until they are sent"""
+        if not messages or subscriber.websocket not in self.subscribers:
+            return
+        subscriber.queue.extend(encode(message, subscriber.encoding) for message in messages)
+        subscriber.drained.clear()
+        subscriber.ready.set()
+        drained = asyncio.create_task(subscriber.drained.wait())
+        try:
+            await asyncio.wait({drained, subscriber.writer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            drained.cancel()
+
+    def resume(self, subscriber: Subscriber, skip: Optional[Callable[[Any], bool]] = None):
+        """Deliver the messages held back while paused, except those ``skip`` says were already sent"""
+        subscriber.paused = False
+        pending, subscriber.pending = subscriber.pending, deque(maxlen=subscriber.queue_size)
+        for data in pending:
+            if skip is None or not skip(data):
+                self._enqueue(subscriber, encode(data, subscriber.encoding))
+
+    def send(self, subscriber: Subscriber, data: Any):
+        """Queue a message for one socket only, behind whatever it already has queued"""
+        if subscriber.websocket in self.subscribers:
+            self._enqueue(subscriber, encode(data, subscriber.encoding))
+
+    async def listen(self, subscriber: Subscriber, on_message: Optional[Callable[[Subscriber, Any], None]] = None):
+        """
+        Read from the socket until it disconnects, sending heartbeats and closing it when idle.
+        Decoded client messages other than pongs are passed to ``on_message``.
+        """
+        websocket = subscriber.websocket
+        try:
+            while websocket in self.subscribers:
+                try:
+                    message = await asyncio.wait_for(websocket.receive(), timeout=WS_HEARTBEAT_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    if time.monotonic() - subscriber.last_seen >= WS_IDLE_TIMEOUT_S:
+                        self.idle_closed += 1
+                        self.disconnect(websocket)
+                        await self._close(websocket, IDLE_CLOSE_CODE)
+                        return
+                    self._enqueue(subscriber, encode(PING, subscriber.encoding))
+                    continue
+                if message["type"] == "websocket.disconnect":
+                    return
+                subscriber.last_seen = time.monotonic()
+                if on_message is not None:
+                    data = decode(message)
+                    if isinstance(data, dict) and data.get("type") != "pong":
+                        on_message(subscriber, data)
+        except RuntimeError:
+            # The broadcaster already closed the socket (slow consumer, failed send).
+            pass
+
+    def disconnect(self, websocket: WebSocket):
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is None:
+            return
+        connection_limiter.release(subscriber.owner)
+        if subscriber.writer and subscriber.writer is not asyncio.current_task():
+            subscriber.writer.cancel()
+
+    def broadcast(self, data: Any):
+        broadcast_bus.publish(self.name, data)
+
+    def deliver(self, data: Any):
+        for observer in self.observers:
+            observer(data)
+        frames: dict[str, tuple[str | bytes, int]] = {}
+        for subscriber in list(self.subscribers.values()):
+            if subscriber.match is not None and not subscriber.match(data):
+                continue
+            if subscriber.paused:
+                if len(subscriber.pending) == subscriber.pending.maxlen:
+                    subscriber.dropped += 1
+                    self.dropped += 1
+                subscriber.pending.append(data)
+                continue
+            frame = frames.get(subscriber.encoding)
+            if frame is None:
+                frame = frames[subscriber.encoding] = encode(data, subscriber.encoding)
+            self._enqueue(subscriber, frame)
+
+    def _enqueue(self, subscriber: Subscriber, frame: tuple[str | bytes, int]):
+        if subscriber.depth >= subscriber.queue_size:
+            if self.policy == DISCONNECT:
+                self._evict(subscriber)
+                return
+            subscriber.queue.popleft()
+            subscriber.dropped += 1
+            self.dropped += 1
+        subscriber.queue.append(frame)
+        subscriber.max_depth = max(subscriber.max_depth, subscriber.depth)
+        subscriber.ready.set()
+
+    def _evict(self, subscriber: Subscriber):
+        self.evicted += 1
+        self.disconnect(subscriber.websocket)
+        task = asyncio.create_task(subscriber.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_done)
+
+    def _close_done(self, task: asyncio.Task):
+        self._close_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Failed to close evicted {self.name} websocket: {task.exception()}")
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _write(self, subscriber: Subscriber):
+        try:
+            while True:
+                await subscriber.ready.wait()
+                while subscriber.queue:
+                    frame, size = subscriber.queue.popleft()
+                    if isinstance(frame, bytes):
+                        await subscriber.websocket.send_bytes(frame)
+                    else:
+                        await subscriber.websocket.send_text(frame)
+                    subscriber.sent += 1
+                    subscriber.bytes_sent += size
+                    self.bytes_sent += size
+                subscriber.ready.clear()
+                subscriber.drained.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Dropping {self.name} websocket after failed send: {e}")
+            self.disconnect(subscriber.websocket)
+
+    def stats(self, detail: bool = True) -> dict:
+        stats = {
+            "connections": len(self.subscribers),
+            "queue_size": self.queue_size,
+            "policy": self.policy,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "idle_closed": self.idle_closed,
+            "queued": sum(subscriber.depth for subscriber in self.subscribers.values()),
+        }
+        if detail:
+            stats["subscribers"] = [subscriber.stats() for subscriber in self.subscribers.values()]
+        return stats
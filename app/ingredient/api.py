@@ -1,7 +1,11 @@
+import datetime
+from typing import Optional
+
 from fastapi import APIRouter
 
-from app.ingredient.schema import IngredientCreate, IngredientRead, IngredientListResponse
-from app.ingredient.crud import create_ingredient, get_ingredients, get_ingredient, delete_ingredient
+from app.config import now_tashkent
+from app.ingredient.schema import IngredientCreate, IngredientRead, IngredientListResponse, IngredientStockRead
+from app.ingredient.crud import create_ingredient, get_ingredients, get_ingredient, delete_ingredient, get_ingredient_stock
 from app.db.get_db import SessionDep
 from app.auth.util import UserDep, ManagerDep
 
@@ -40,6 +44,18 @@ async def get_ingredient_endpoint(
     return IngredientRead.model_validate(db_ingredient)
 
 
+@router.get("/{ingredient_id}/stock", response_model=IngredientStockRead)
+async def get_ingredient_stock_endpoint(
+        ingredient_id: int,
+        current_user: UserDep,
+        db: SessionDep,
+        at: Optional[datetime.datetime] = None
+):
+    at = at or now_tashkent()
+    weight = await get_ingredient_stock(db, ingredient_id, at)
+    return IngredientStockRead(ingredient_id=ingredient_id, at=at, weight=weight)
+
+
 @router.delete("/{ingredient_id}")
 async def delete_ingredient_endpoint(
         ingredient_id: int,
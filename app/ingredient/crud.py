@@ -1,9 +1,13 @@
+import datetime
+
 from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
+from app.endpoints.portion_estimation import portion_worker
+from app.functions.inventory_ledger import get_stock_at
 from app.models.meal_ingredient import Ingredient
 from app.ingredient.schema import IngredientCreate
 
@@ -43,12 +47,27 @@ async def get_ingredient(db: AsyncSession, ingredient_id: int) -> Ingredient:
     return db_ingredient
 
 
+async def get_ingredient_stock(db: AsyncSession, ingredient_id: int, at: datetime.datetime) -> float:
+    await get_ingredient(db, ingredient_id)
+    try:
+        return await get_stock_at(db, ingredient_id, at)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
 async def delete_ingredient(db: AsyncSession, ingredient_id: int):
     try:
         db_ingredient = await get_ingredient(db, ingredient_id)
+        meal_ids = [meal_ingredient.meal_id for meal_ingredient in db_ingredient.meals]
 
+        # Drop it from the recipes first; left loaded, the ORM would try to null their primary key.
+        for meal_ingredient in db_ingredient.meals:
+            await db.delete(meal_ingredient)
         await db.delete(db_ingredient)
         await db.commit()
+
+        portion_worker.mark_dirty(meal_ids=meal_ids)
+
         return {"msg": "Ingredient deleted successfully"}
     except Exception as e:
         await db.rollback()
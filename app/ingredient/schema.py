@@ -41,3 +41,9 @@ class IngredientShallow(TashkentBaseModel):
     updated_at: datetime.datetime = Field(..., description="The time the ingredient was updated")
 
     model_config = ConfigDict(from_attributes=True, arbitrary_types_allowed=True, validate_assignment=True)
+
+
+class IngredientStockRead(TashkentBaseModel):
+    ingredient_id: int = Field(..., description="The ID of the ingredient")
+    at: datetime.datetime = Field(..., description="The time the stock is reported for")
+    weight: float = Field(..., description="The weight in grams in stock at that time")
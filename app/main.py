@@ -4,9 +4,17 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.auth.blacklist import token_revocations
 from app.auth.superuser import create_superuser
 from app.changes.funcs import process_log_queue
 from app.db.base import create_db_and_tables
+from app.endpoints.notification import alert_aggregator, notification_outbox, unread_counter
+from app.endpoints.portion_estimation import portion_worker, portion_stream
+from app.functions.log_sink import action_log_sink, login_info_sink
+from app.functions.broadcast_bus import broadcast_bus
+from app.db.db import async_session_maker
+from app.functions.portion_estimation import estimate_portions
+from app.functions.recipe_graph import recipe_graph, register_recipe_graph_listeners
 from app import router
 from app.middleware.login_middleware import LoggingMiddleware
 from app.changes.track_models import register_event_listeners
@@ -17,16 +25,39 @@ async def lifespan(main_app: FastAPI):
     await create_db_and_tables()
     await create_superuser()
     register_event_listeners()
+    register_recipe_graph_listeners()
+    await broadcast_bus.start()
+    async with async_session_maker() as session:
+        await token_revocations.load(session)
+        await recipe_graph.load(session)
+        await estimate_portions(session)
+        await portion_stream.load(session)
     log_queue_task = asyncio.create_task(process_log_queue())
+    portion_worker_task = asyncio.create_task(portion_worker.run())
+    alert_aggregator_task = asyncio.create_task(alert_aggregator.run())
+    notification_outbox_task = asyncio.create_task(notification_outbox.run())
+    unread_counter_task = asyncio.create_task(unread_counter.run())
+    token_revocations_task = asyncio.create_task(token_revocations.run())
+    log_sink_tasks = [asyncio.create_task(sink.run()) for sink in (action_log_sink, login_info_sink)]
 
     try:
         yield
     finally:
-        log_queue_task.cancel()
+        for task in (log_queue_task, portion_worker_task, alert_aggregator_task, notification_outbox_task,
+                     unread_counter_task, token_revocations_task, *log_sink_tasks):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await notification_outbox.flush()
+        for sink in (action_log_sink, login_info_sink):
+            await sink.flush()
         try:
-            await log_queue_task
-        except asyncio.CancelledError:
-            pass
+            await alert_aggregator.flush()
+        except Exception as e:
+            print(f"❌ Final alert count flush failed: {e}")
+        await broadcast_bus.stop()
 
 
 app = FastAPI(
@@ -1,70 +1,93 @@
 import time
 import logging
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-import jwt
+
 from jwt import PyJWTError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.auth.principal import decode_token
 from app.changes.funcs import set_current_user
-from app.config import SECRET, ALGORITHM
-from app.db.db import async_session_maker
+from app.config import now_tashkent
+from app.functions.log_sink import action_log_sink
 from app.models.action_log import ActionLog
 
 logger = logging.getLogger("uvicorn.access")
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
+PATH_MAX_LENGTH = ActionLog.__table__.c.path.type.length
+QUERY_MAX_LENGTH = ActionLog.__table__.c.query.type.length
+
+
+class LoggingMiddleware:
+    """
+    Raw ASGI middleware: sets the current user for change tracking and queues an ActionLog row for
+    every authenticated HTTP request. The verified token claims are left on ``request.state``.
+
+    The status code comes from the ``http.response.start`` message, so the response body is passed
+    through untouched (streaming keeps working) and no extra task is spawned. Websocket and
+    lifespan scopes go straight to the app.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-        user_info = {
-            "user_id": None,
-            "email": None,
-            "role": None,
-            "username": None,
-            "phone": None,
-        }
-        request.state.query = str(request.url.query)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        token = request.headers.get("Authorization")
-        authorized = False
+        start_time = time.time()
+        query = scope.get("query_string", b"").decode("latin-1")
+        scope.setdefault("state", {})["query"] = query
+
+        user_info = None
+        token = Headers(scope=scope).get("Authorization")
         if token and token.startswith("Bearer "):
-            token = token[7:]
             try:
-                payload = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
-                user_info["user_id"] = payload.get("user_id")
-                user_info["email"] = payload.get("email")
-                user_info["role"] = payload.get("role")
-                user_info["username"] = payload.get("sub")
-                user_info["phone"] = payload.get("phone")
-                request.state.user = user_info
-                authorized = True
-
+                payload = decode_token(token[7:])
+                # Decoded once here; get_current_user picks it up from request.state
+                scope["state"]["token"] = token[7:]
+                scope["state"]["token_payload"] = payload
+                user_info = {
+                    "user_id": payload.get("user_id"),
+                    "email": payload.get("email"),
+                    "role": payload.get("role"),
+                    "username": payload.get("sub"),
+                    "phone": payload.get("phone"),
+                }
+                scope["state"]["user"] = user_info
                 set_current_user(user_info["user_id"])
             except PyJWTError:
                 pass
 
-        response: Response = await call_next(request)
-
-        if authorized:
-            process_time = round(time.time() - start_time, 4)
-
-            log_data = ActionLog(
-                user_id=user_info["user_id"],
-                phone=user_info["phone"],
-                email=user_info["email"],
-                username=user_info["username"],
-                role=user_info["role"],
-                query=request.state.query,
-                path=request.url.path,
-                method=request.method,
-                status_code=response.status_code,
-                process_time=process_time,
-                client_host=request.client.host,
-            )
+        if user_info is None:
+            await self.app(scope, receive, send)
+            return
 
-            async with async_session_maker() as session:
-                session.add(log_data)
-                await session.commit()
+        status_code = 500  # Stays 500 if the app fails before starting a response
 
-        return response
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            now = now_tashkent()
+            client = scope.get("client")
+            action_log_sink.put_nowait({
+                "user_id": user_info["user_id"],
+                "phone": user_info["phone"],
+                "email": user_info["email"],
+                "username": user_info["username"],
+                "role": user_info["role"],
+                "query": query[:QUERY_MAX_LENGTH],
+                "path": scope["path"][:PATH_MAX_LENGTH],
+                "method": scope["method"],
+                "status_code": status_code,
+                "process_time": round(time.time() - start_time, 4),
+                "client_host": client[0] if client else "",
+                "created_at": now,
+                "updated_at": now,
+            })
@@ -0,0 +1,25 @@
+from sqlalchemy import ForeignKey, Integer, String, JSON, TIMESTAMP, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+import datetime
+
+from app.db.base import Base
+from app.config import now_tashkent
+
+
+class IdempotencyKey(Base):
+    """First response of a mutating request sent with an ``Idempotency-Key`` header"""
+    __tablename__ = 'idempotency_key'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    key: Mapped[str] = mapped_column(String(length=255))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id', ondelete='CASCADE'))
+    endpoint: Mapped[str] = mapped_column(String(length=255))
+    request_hash: Mapped[str] = mapped_column(String(length=64))
+    status_code: Mapped[int | None] = mapped_column(Integer, nullable=True)  # None while the request is in flight
+    response: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), default=now_tashkent)
+    expires_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), index=True)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'endpoint', 'key', name='idempotency_key_user_id_endpoint_key_key'),
+    )
@@ -0,0 +1,45 @@
+from enum import Enum as enum_Enum
+
+from sqlalchemy import ForeignKey, Float, Integer, TIMESTAMP, Index, Enum as sql_Enum
+from sqlalchemy.orm import Mapped, mapped_column
+import datetime
+
+from app.db.base import Base
+from app.config import now_tashkent
+
+
+class LedgerSource(enum_Enum):
+    OPENING = 'opening'
+    DELIVERY = 'delivery'
+    SERVING = 'serving'
+    CORRECTION = 'correction'
+
+
+class InventoryLedger(Base):
+    """Append-only record of every stock change; ``Ingredient.weight`` is the running sum of ``delta``"""
+    __tablename__ = 'inventory_ledger'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    ingredient_id: Mapped[int] = mapped_column(ForeignKey('ingredient.id', ondelete='CASCADE'))
+    delta: Mapped[float] = mapped_column(Float)  # Weight in grams, negative when stock is consumed
+    source: Mapped[LedgerSource] = mapped_column(sql_Enum(LedgerSource))
+    source_id: Mapped[int | None] = mapped_column(Integer, nullable=True)  # Delivery / serving that caused it
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), default=now_tashkent)
+
+    __table_args__ = (
+        Index('ix_inventory_ledger_ingredient_id_created_at', 'ingredient_id', 'created_at'),
+    )
+
+
+class InventorySnapshot(Base):
+    """Stock of an ingredient at ``taken_at``, i.e. the sum of its ledger deltas up to that time"""
+    __tablename__ = 'inventory_snapshot'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    ingredient_id: Mapped[int] = mapped_column(ForeignKey('ingredient.id', ondelete='CASCADE'))
+    weight: Mapped[float] = mapped_column(Float)
+    taken_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True))
+
+    __table_args__ = (
+        Index('ix_inventory_snapshot_ingredient_id_taken_at', 'ingredient_id', 'taken_at'),
+    )
@@ -15,7 +15,8 @@ class MealIngredient(Base):
     __tablename__ = "meal_ingredient"
 
     meal_id: Mapped[int] = mapped_column(ForeignKey("meal.id", ondelete="CASCADE"), primary_key=True)
-    ingredient_id: Mapped[int] = mapped_column(ForeignKey("ingredient.id", ondelete="CASCADE"), primary_key=True)
+    ingredient_id: Mapped[int] = mapped_column(ForeignKey("ingredient.id", ondelete="CASCADE"), primary_key=True,
+                                               index=True)
     weight: Mapped[float] = mapped_column(Float)
 
     ingredient: Mapped["Ingredient"] = relationship(back_populates="meals", lazy="selectin")
@@ -50,3 +51,11 @@ class Meal(Base):
     ingredients: Mapped[List["MealIngredient"]] = relationship(back_populates="meal", lazy="selectin")
     servings: Mapped[List["MealServing"]] = relationship(back_populates="meal", lazy="selectin")
 
+
+
+class RecipeVersion(Base):
+    """Single row counter bumped in every transaction that changes recipes; API workers compare it with their graph"""
+    __tablename__ = 'recipe_version'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
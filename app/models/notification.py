@@ -1,11 +1,17 @@
-from sqlalchemy import ForeignKey, Integer, String, Float
+from sqlalchemy import ForeignKey, Integer, String, Float, TIMESTAMP, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column
+import datetime
 
 from app.db.base import Base
 
 
 class Notification(Base):
     __tablename__ = 'notification'
+    __table_args__ = (
+        # Keyset pages: newest first, optionally within one type
+        Index('ix_notification_type_timestamp_id', 'type', text('"timestamp" DESC'), text('id DESC')),
+        Index('ix_notification_timestamp_id', text('"timestamp" DESC'), text('id DESC')),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     type: Mapped[str] = mapped_column(String(length=50), nullable=True)
@@ -16,4 +22,14 @@ class Notification(Base):
     threshold: Mapped[float] = mapped_column(Float, nullable=True)
     meal_id: Mapped[int] = mapped_column(ForeignKey("meal.id"), nullable=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=True)
-    timestamp: Mapped[str] = mapped_column(String, nullable=True)
+    timestamp: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
+    occurrence_count: Mapped[int] = mapped_column(Integer, default=1, server_default='1')  # Repeats coalesced into this row
+    last_seen: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+
+
+class NotificationReadCursor(Base):
+    __tablename__ = 'notification_read_cursor'
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    last_read_id: Mapped[int] = mapped_column(Integer, default=0, server_default='0')  # Everything up to it is read
+    updated_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
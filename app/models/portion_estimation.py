@@ -10,7 +10,7 @@ class PortionEstimation(Base):
     __tablename__ = "portion_estimation"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    meal_id: Mapped[int] = mapped_column(ForeignKey("meal.id"), nullable=False)
+    meal_id: Mapped[int] = mapped_column(ForeignKey("meal.id"), nullable=False, unique=True)
     meal_name: Mapped[str] = mapped_column(String(length=255), nullable=False)
     portion_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
     created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), default=now_tashkent)
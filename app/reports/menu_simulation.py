@@ -0,0 +1,110 @@
+from typing import Any, Dict
+
+import numpy as np
+from sqlalchemy.future import select
+
+from fastapi import APIRouter, HTTPException, status
+
+from app.auth.util import ManagerDep
+from app.db.get_db import SessionDep
+from app.functions.recipe_graph import recipe_graph
+from app.models.meal_ingredient import Ingredient
+from app.schemas.menu_simulation import MenuSimulationRequest
+
+router = APIRouter()
+
+
+@router.post("/", response_model=Dict[str, Any])
+async def simulate_menu_plan(
+        plan: MenuSimulationRequest,
+        current_user: ManagerDep,
+        db: SessionDep,
+) -> Dict[str, Any]:
+    """
+    Run a day-by-day menu plan against the current inventory without touching it.
+
+    Expected deliveries arrive before the servings of their day (or of the next planned day).
+    Returns the first day an ingredient goes short, the remaining stock per day for every
+    ingredient the plan touches and the total purchasing needed to cover the whole plan.
+    """
+    days = sorted(plan.days, key=lambda d: d.day)
+    day_dates = [d.day for d in days]
+    if len(set(day_dates)) != len(day_dates):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Each day may appear only once in the plan")
+
+    await recipe_graph.ensure_loaded(db)
+    unknown = sorted({m.meal_id for d in days for m in d.meals if m.meal_id not in recipe_graph.meal_names})
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Meals not found: {unknown}")
+
+    ingredient_ids = recipe_graph.ingredients_in_recipes()
+    meal_ids = sorted({m.meal_id for d in days for m in d.meals if recipe_graph.meal_row(m.meal_id) is not None})
+    meal_index = {meal_id: i for i, meal_id in enumerate(meal_ids)}
+
+    # days x meals quantities and days x ingredients deliveries, consumption via one matmul
+    quantities = np.zeros((len(days), len(meal_ids)))
+    for i, d in enumerate(days):
+        for m in d.meals:
+            if m.meal_id in meal_index:
+                quantities[i, meal_index[m.meal_id]] += m.quantity
+    consumption = quantities @ recipe_graph.dense()[[recipe_graph.meal_row(meal_id) for meal_id in meal_ids]]
+
+    deliveries = np.zeros((len(days), len(ingredient_ids)))
+    plan_days = np.array(day_dates)
+    for delivery in plan.deliveries:
+        column = recipe_graph.ingredient_column(delivery.ingredient_id)
+        day_index = int(np.searchsorted(plan_days, delivery.day))
+        if column is not None and day_index < len(days):
+            deliveries[day_index, column] += delivery.weight
+
+    res = await db.execute(select(Ingredient.id, Ingredient.name, Ingredient.weight)
+                           .where(Ingredient.id.in_(ingredient_ids)))
+    ingredients = {row.id: row for row in res.all()}
+    stock = np.array([ingredients[i].weight if i in ingredients else 0 for i in ingredient_ids])
+
+    remaining = stock + np.cumsum(deliveries - consumption, axis=0)
+    touched = np.flatnonzero((consumption > 0).any(axis=0) | (deliveries > 0).any(axis=0))
+
+    short_days = np.flatnonzero((remaining[:, touched] < 0).any(axis=1))
+    first_shortage = None
+    if len(short_days):
+        day_index = int(short_days[0])
+        short_columns = touched[remaining[day_index, touched] < 0]
+        first_shortage = {
+            "day": day_dates[day_index],
+            "ingredients": [
+                {
+                    "ingredient_id": ingredient_ids[column],
+                    "ingredient_name": ingredients[ingredient_ids[column]].name if ingredient_ids[column] in ingredients else None,
+                    "shortfall": round(float(-remaining[day_index, column]), 2),
+                }
+                for column in short_columns
+            ]
+        }
+
+    purchasing_needed = np.maximum(0, -remaining[:, touched].min(axis=0))
+    purchasing = [
+        {
+            "ingredient_id": ingredient_ids[column],
+            "ingredient_name": ingredients[ingredient_ids[column]].name if ingredient_ids[column] in ingredients else None,
+            "weight": round(float(weight), 2),
+        }
+        for column, weight in zip(touched, purchasing_needed)
+        if weight > 0
+    ]
+
+    return {
+        "feasible": first_shortage is None,
+        "first_shortage": first_shortage,
+        "remaining_stock": [
+            {
+                "day": day_dates[i],
+                "ingredients": {
+                    ingredient_ids[column]: round(float(remaining[i, column]), 2)
+                    for column in touched
+                }
+            }
+            for i in range(len(days))
+        ],
+        "purchasing_needed": purchasing,
+    }
@@ -2,15 +2,19 @@ import calendar
 from datetime import datetime, date
 from typing import Any, Dict
 
+import numpy as np
 from sqlalchemy import func, case
 from sqlalchemy.future import select
 
 from fastapi import APIRouter
 
+from app.config import now_tashkent
 from app.db.get_db import SessionDep
 from app.endpoints.notification import broadcast_alert
+from app.functions.portion_engine import max_portions
+from app.functions.recipe_graph import recipe_graph
 from app.models.delivery import IngredientDelivery
-from app.models.meal_ingredient import MealIngredient, Meal
+from app.models.meal_ingredient import Meal
 from app.models.serve_meal import MealServing
 
 router = APIRouter()
@@ -53,8 +57,9 @@ async def get_monthly_summary_report(
         .select_from(IngredientDelivery)
         .where(func.date(IngredientDelivery.created_at) <= last_day)
         .group_by(IngredientDelivery.ingredient_id)
-        .subquery()
     )
+    res = await db.execute(total_ingredient_deliveries_query)
+    total_delivered = dict(res.all())
 
     # Query 2: Get actual servings count per meal (separate from ingredients calculation)
     actual_servings_per_meal_query = (
@@ -71,53 +76,25 @@ async def get_monthly_summary_report(
         .select_from(Meal)
         .outerjoin(MealServing, Meal.id == MealServing.meal_id)
         .group_by(Meal.id, Meal.name)
-        .subquery()
     )
-
-    # Query 3: Calculate maximum possible servings based on ingredients (separate query)
-    max_possible_servings_query = (
-        select(
-            Meal.id.label('meal_id'),
-            func.min(
-                func.floor(
-                    total_ingredient_deliveries_query.c.total_delivered / MealIngredient.weight
-                )
-            ).label('max_possible_servings_from_deliveries')
-        )
-        .select_from(Meal)
-        .join(MealIngredient, Meal.id == MealIngredient.meal_id)
-        .join(total_ingredient_deliveries_query,
-              MealIngredient.ingredient_id == total_ingredient_deliveries_query.c.ingredient_id)
-        .group_by(Meal.id)
-        .subquery()
-    )
-
-    # Query 4: Combine the results
-    meal_analysis_query = (
-        select(
-            actual_servings_per_meal_query.c.meal_id,
-            actual_servings_per_meal_query.c.meal_name,
-            actual_servings_per_meal_query.c.portions_served_this_month,
-            func.coalesce(max_possible_servings_query.c.max_possible_servings_from_deliveries, 0).label(
-                'max_possible_servings_from_deliveries')
-        )
-        .select_from(actual_servings_per_meal_query)
-        .outerjoin(max_possible_servings_query,
-                   actual_servings_per_meal_query.c.meal_id == max_possible_servings_query.c.meal_id)
-        .subquery()
-    )
-
-    # Execute the query to get per-meal data
-    res = await db.execute(select(meal_analysis_query))
+    res = await db.execute(actual_servings_per_meal_query)
     meal_analysis = res.fetchall()
 
+    # Maximum possible servings per meal from the cached recipe matrix; like the former join on the
+    # deliveries subquery, ingredients that were never delivered are left out of the minimum.
+    await recipe_graph.ensure_loaded(db)
+    delivered = np.array([total_delivered.get(ingredient_id, 0)
+                          for ingredient_id in recipe_graph.ingredients_in_recipes()])
+    weights = recipe_graph.dense() * (delivered > 0)
+    max_possible_servings = dict(zip(recipe_graph.meals_with_recipes(), max_portions(weights, delivered).tolist()))
+
     meal_summaries = []
     total_served_all_meals = 0
     total_could_serve_all_meals = 0
 
     for row in meal_analysis:
         portions_served = row.portions_served_this_month
-        max_possible = row.max_possible_servings_from_deliveries or 0
+        max_possible = max_possible_servings.get(row.meal_id, 0)
 
         # Calculate difference rate for this meal
         if max_possible > 0:
@@ -174,8 +151,8 @@ async def get_monthly_summary_report(
             'difference_rate': round(overall_difference_rate, 2),
             'threshold': threshold_percentage,
             'message': report['overall_summary']['summary'],
-            'timestamp': datetime.now().isoformat()
-        }, db)
+            'timestamp': now_tashkent()
+        })
 
     return report
 
@@ -0,0 +1,35 @@
+import datetime
+
+from pydantic import Field, ConfigDict
+from typing import List
+
+from app.schemas.util import TashkentBaseModel
+
+
+class MenuPlanMeal(TashkentBaseModel):
+    meal_id: int = Field(..., description="The ID of the meal")
+    quantity: int = Field(..., ge=0, description="The number of portions planned")
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class MenuPlanDay(TashkentBaseModel):
+    day: datetime.date = Field(..., description="The day the meals are planned for")
+    meals: List[MenuPlanMeal] = Field(default_factory=list, description="Meals planned for the day")
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class ExpectedDelivery(TashkentBaseModel):
+    day: datetime.date = Field(..., description="The day the delivery is expected, before that day's servings")
+    ingredient_id: int = Field(..., description="The ID of the ingredient")
+    weight: float = Field(..., gt=0, description="The weight in grams expected to be delivered")
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class MenuSimulationRequest(TashkentBaseModel):
+    days: List[MenuPlanDay] = Field(..., min_length=1, description="The day-by-day menu plan")
+    deliveries: List[ExpectedDelivery] = Field(default_factory=list, description="Expected deliveries")
+
+    model_config = ConfigDict(extra='forbid')
@@ -0,0 +1,14 @@
+from pydantic import Field, ConfigDict
+
+from app.schemas.util import TashkentBaseModel
+
+
+class NotificationReadUpdate(TashkentBaseModel):
+    last_read_id: int = Field(..., ge=0, description="ID of the newest notification the user has seen")
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class UnreadCountRead(TashkentBaseModel):
+    last_read_id: int = Field(..., description="ID of the newest notification the user has seen")
+    unread_count: int = Field(..., description="Number of notifications newer than last_read_id")
@@ -14,6 +14,19 @@ class ServeMealCreate(TashkentBaseModel):
     model_config = ConfigDict(extra='forbid')
 
 
+class ServeMealBatchItem(TashkentBaseModel):
+    meal_id: int = Field(..., description="The ID of the meal")
+    quantity: int = Field(..., gt=0, description="The number of portions to serve")
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class ServeMealBatchCreate(TashkentBaseModel):
+    items: List[ServeMealBatchItem] = Field(..., min_length=1, description="Meals and portion counts to serve")
+
+    model_config = ConfigDict(extra='forbid')
+
+
 class ServeMealRead(ServeMealCreate):
     id: int = Field(..., description="The ID of the meal serving")
     served_by: int = Field(..., description="The ID of the user who served the meal")
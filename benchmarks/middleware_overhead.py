@@ -0,0 +1,131 @@
+"""
+Middleware overhead benchmark: per-request cost of the request-logging middleware on a trivial endpoint.
+
+Compares a bare app, the previous ``BaseHTTPMiddleware`` version of ``LoggingMiddleware`` (kept below
+for the comparison) and the current raw ASGI one, for anonymous and authenticated requests. The
+ASGI app is called directly with in-memory ``receive``/``send``, so only the application stack is
+measured; ActionLog rows go to the (not running) write-behind buffer, which is cleared between
+runs. Needs ``SECRET`` and ``ALGORITHM`` like the app itself. Run from the repository root:
+
+    python -m benchmarks.middleware_overhead --requests 20000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import jwt
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+from jwt import PyJWTError
+
+from app.changes.funcs import set_current_user
+from app.config import SECRET, ALGORITHM, now_tashkent
+from app.functions.log_sink import action_log_sink
+from app.middleware.login_middleware import LoggingMiddleware
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    """The ``BaseHTTPMiddleware`` implementation this benchmark compares against"""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        user_info = {"user_id": None, "email": None, "role": None, "username": None, "phone": None}
+        request.state.query = str(request.url.query)
+
+        token = request.headers.get("Authorization")
+        authorized = False
+        if token and token.startswith("Bearer "):
+            try:
+                payload = jwt.decode(token[7:], SECRET, algorithms=[ALGORITHM])
+                user_info.update(user_id=payload.get("user_id"), email=payload.get("email"),
+                                 role=payload.get("role"), username=payload.get("sub"), phone=payload.get("phone"))
+                request.state.user = user_info
+                authorized = True
+                set_current_user(user_info["user_id"])
+            except PyJWTError:
+                pass
+
+        response: Response = await call_next(request)
+
+        if authorized:
+            now = now_tashkent()
+            action_log_sink.put_nowait({
+                **user_info, "query": request.state.query, "path": request.url.path, "method": request.method,
+                "status_code": response.status_code, "process_time": round(time.time() - start_time, 4),
+                "client_host": request.client.host, "created_at": now, "updated_at": now,
+            })
+        return response
+
+
+def make_app(middleware) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+
+async def call(app, headers: list[tuple[bytes, bytes]]) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"limit=10",
+        "headers": headers, "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    status_code = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+async def measure(app, headers, requests: int) -> list[float]:
+    for _ in range(min(500, requests)):  # Warm up routing, dependency caches, etc.
+        await call(app, headers)
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        status_code = await call(app, headers)
+        samples.append(time.perf_counter() - start)
+        if status_code != 200:
+            raise SystemExit(f"Unexpected status {status_code}")
+    action_log_sink.buffer.clear()
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = jwt.encode({"sub": "bench", "user_id": 1, "role": "admin", "phone": "+998000000000",
+                        "email": "bench@example.com"}, SECRET, algorithm=ALGORITHM)
+    variants = [("no middleware", None), ("BaseHTTPMiddleware", LegacyLoggingMiddleware),
+                ("raw ASGI", LoggingMiddleware)]
+    callers = [("anonymous", []), ("authenticated", [(b"authorization", f"Bearer {token}".encode())])]
+
+    print(f"{args.requests} GET /ping per run")
+    for caller, headers in callers:
+        baseline = None
+        for name, middleware in variants:
+            samples = await measure(make_app(middleware), headers, args.requests)
+            median = statistics.median(samples) * 1e6
+            p99 = sorted(samples)[int(len(samples) * 0.99)] * 1e6
+            baseline = median if baseline is None else baseline
+            print(f"{caller:<14} {name:<20} p50 {median:>8.1f}us p99 {p99:>8.1f}us "
+                  f"overhead {median - baseline:>+8.1f}us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
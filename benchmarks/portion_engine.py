@@ -0,0 +1,80 @@
+"""
+Micro-benchmark: vectorized portion engine vs. the old per-row estimate loop.
+
+Run from the repository root:
+
+    python -m benchmarks.portion_engine
+"""
+import random
+import time
+
+import numpy as np
+
+from app.functions.portion_engine import max_portions
+
+INGREDIENTS_PER_MEAL = 8
+REPEAT = 5
+
+
+def make_catalog(meals: int, ingredients: int, seed: int = 42):
+    rng = random.Random(seed)
+    stock = [rng.uniform(0, 50_000) for _ in range(ingredients)]
+    rows = []  # (meal_id, meal_name, recipe weight, ingredient stock) as returned by the old join
+    weights = np.zeros((meals, ingredients))
+    for meal_id in range(meals):
+        for ingredient_id in rng.sample(range(ingredients), INGREDIENTS_PER_MEAL):
+            weight = rng.choice([0.0, rng.uniform(5, 500)])
+            rows.append((meal_id, f"meal {meal_id}", weight, stock[ingredient_id]))
+            weights[meal_id, ingredient_id] = weight
+    return rows, weights, np.array(stock)
+
+
+def loop_estimate(rows):
+    meal_map = {}
+    for meal_id, meal_name, mi_weight, ing_weight in rows:
+        meal_map.setdefault(meal_id, {
+            "meal_id": meal_id,
+            "meal_name": meal_name,
+            "portion_count": float('inf')
+        })
+
+        if mi_weight == 0:
+            continue
+        possible = ing_weight // mi_weight
+        meal_map[meal_id]["portion_count"] = min(meal_map[meal_id]["portion_count"], possible)
+
+    for meal in meal_map.values():
+        if meal["portion_count"] == float('inf'):
+            meal["portion_count"] = 0
+        meal["portion_count"] = int(meal["portion_count"])
+    return meal_map
+
+
+def best_of(func, *args):
+    best = float('inf')
+    result = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    print(f"{'meals':>8} {'ingredients':>12} {'loop ms':>10} {'engine ms':>10} {'speedup':>8}")
+    for meals in (100, 1_000, 10_000):
+        ingredients = max(50, meals // 10)
+        rows, weights, stock = make_catalog(meals, ingredients)
+
+        loop_time, meal_map = best_of(loop_estimate, rows)
+        engine_time, counts = best_of(max_portions, weights, stock)
+
+        expected = [meal_map[meal_id]["portion_count"] for meal_id in range(meals)]
+        assert counts.tolist() == expected, "engine and loop disagree"
+
+        print(f"{meals:>8} {ingredients:>12} {loop_time * 1000:>10.2f} {engine_time * 1000:>10.2f} "
+              f"{loop_time / engine_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
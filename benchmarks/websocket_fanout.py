@@ -0,0 +1,175 @@
+"""
+Websocket fan-out benchmark: the old sequential ``await send_json`` loop vs. ``WebSocketBroadcaster``.
+
+500 simulated clients, a few of them stalled (each send takes ``--stall-ms``) and a few dead (send
+raises), some of them on the msgpack subprotocol. Sockets are in-process fakes, so only the fan-out
+itself is measured. A second part compares encoding a portions payload once per broadcast with
+``send_json``'s per-client ``json.dumps``, and the JSON vs. msgpack frame size. Run from the
+repository root:
+
+    python -m benchmarks.websocket_fanout
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import msgpack
+import orjson
+
+from app.functions.websocket import WebSocketBroadcaster, DROP_OLDEST, DISCONNECT, MSGPACK_SUBPROTOCOL, JSON, encode
+
+
+class FakeWebSocket:
+    def __init__(self, index: int, delay: float = 0.0, dead: bool = False, msgpack_client: bool = False):
+        self.client = None
+        self.scope = {"subprotocols": [MSGPACK_SUBPROTOCOL] if msgpack_client else []}
+        self.index = index
+        self.delay = delay
+        self.dead = dead
+        self.received: list[float] = []  # Delivery latency of every message
+
+    async def accept(self, subprotocol: str | None = None):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def _deliver(self, data):
+        if self.dead:
+            raise RuntimeError("socket is closed")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append(time.perf_counter() - data["sent_at"])
+
+    async def send_json(self, data):
+        json.dumps(data)  # What Starlette's send_json does for every client
+        await self._deliver(data)
+
+    async def send_text(self, text: str):
+        await self._deliver(orjson.loads(text))
+
+    async def send_bytes(self, frame: bytes):
+        await self._deliver(msgpack.unpackb(frame))
+
+
+def make_clients(args) -> list[FakeWebSocket]:
+    clients = []
+    for i in range(args.clients):
+        if i < args.stalled:
+            clients.append(FakeWebSocket(i, delay=args.stall_ms / 1000))
+        elif i < args.stalled + args.dead:
+            clients.append(FakeWebSocket(i, dead=True))
+        else:
+            clients.append(FakeWebSocket(i, msgpack_client=i % 100 < args.msgpack_percent))
+    return clients
+
+
+def healthy(clients: list[FakeWebSocket]) -> list[FakeWebSocket]:
+    return [c for c in clients if not c.delay and not c.dead]
+
+
+def summarize(name: str, broadcast_times: list[float], clients: list[FakeWebSocket], messages: int):
+    latencies = sorted(latency for c in healthy(clients) for latency in c.received)
+    delivered = sum(len(c.received) for c in healthy(clients))
+    expected = messages * len(healthy(clients))
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else float('nan')
+    print(f"{name:<26} broadcast p50 {statistics.median(broadcast_times) * 1000:>9.3f}ms "
+          f"max {max(broadcast_times) * 1000:>9.3f}ms | healthy clients got {delivered}/{expected} "
+          f"| delivery p99 {p99:>8.2f}ms")
+
+
+async def run_legacy(args):
+    clients = make_clients(args)
+    times = []
+    for n in range(args.messages):
+        start = time.perf_counter()
+        try:
+            for connection in clients:
+                await connection.send_json({"n": n, "sent_at": start})
+        except Exception:
+            pass  # What the old callers did: log and move on, everyone after the dead socket misses it
+        times.append(time.perf_counter() - start)
+    summarize("sequential send_json", times, clients, args.messages)
+
+
+async def run_broadcaster(args, policy: str):
+    clients = make_clients(args)
+    broadcaster = WebSocketBroadcaster("bench", queue_size=args.queue_size, policy=policy)
+    for client in clients:
+        await broadcaster.connect(client)
+
+    times = []
+    for n in range(args.messages):
+        start = time.perf_counter()
+        broadcaster.broadcast({"n": n, "sent_at": start})
+        times.append(time.perf_counter() - start)
+        await asyncio.sleep(args.interval_ms / 1000)
+
+    # Let the healthy writers drain, then stop everything.
+    deadline = time.perf_counter() + 5
+    while time.perf_counter() < deadline and any(len(c.received) < args.messages for c in healthy(clients)):
+        await asyncio.sleep(0.01)
+    stats = broadcaster.stats()
+    for client in list(broadcaster.subscribers):
+        broadcaster.disconnect(client)
+
+    summarize(f"broadcaster ({policy})", times, clients, args.messages)
+    depths = [s["max_queue_depth"] for s in stats["subscribers"]]
+    print(f"{'':<26} connections left {stats['connections']} (pruned {args.clients - stats['connections']}), "
+          f"dropped {stats['dropped']}, evicted {stats['evicted']}, max queue depth {max(depths, default=0)}")
+
+
+def portions_payload(meals: int) -> list[dict]:
+    return [{"meal_id": i, "meal_name": f"Meal number {i}", "portion_count": (i * 37) % 500} for i in range(meals)]
+
+
+def run_encoding(args):
+    payload = portions_payload(args.payload_meals)
+    repeat = 20
+    print(f"\nencoding a {args.payload_meals}-meal portions payload for {args.clients} clients")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _ in range(args.clients):
+            json.dumps(payload)
+    per_client = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode(payload, JSON)
+        encode(payload, MSGPACK_SUBPROTOCOL)
+    once = (time.perf_counter() - start) / repeat
+
+    json_size = encode(payload, JSON)[1]
+    msgpack_size = encode(payload, MSGPACK_SUBPROTOCOL)[1]
+    print(f"{'json.dumps per client':<26} {per_client * 1000:>9.3f}ms per broadcast")
+    print(f"{'encode once (json+msgpack)':<26} {once * 1000:>9.3f}ms per broadcast ({per_client / once:.0f}x less)")
+    print(f"{'frame size':<26} json {json_size} B, msgpack {msgpack_size} B "
+          f"({100 * (1 - msgpack_size / json_size):.0f}% smaller)")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--stalled", type=int, default=5)
+    parser.add_argument("--dead", type=int, default=5)
+    parser.add_argument("--stall-ms", type=float, default=200)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--msgpack-percent", type=int, default=50, help="Share of clients on the msgpack subprotocol")
+    parser.add_argument("--payload-meals", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.stalled} stalled ({args.stall_ms:.0f}ms per send), {args.dead} dead, "
+          f"{args.messages} messages")
+    await run_broadcaster(args, DROP_OLDEST)
+    await run_broadcaster(args, DISCONNECT)
+    await run_legacy(args)
+    run_encoding(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())